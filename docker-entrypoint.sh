@@ -13,6 +13,9 @@ python src/manage.py migrate
 
 python src/manage.py collectstatic --noinput
 
+# Статические копии информационных страниц и услуг для nginx
+python src/manage.py prerender
+
 # Запускаем сервер Django
 echo "Запускаем Django-сервер..."
 exec python src/manage.py runserver 0.0.0.0:8000
\ No newline at end of file
@@ -1,36 +1,147 @@
-from django.contrib import admin
+from datetime import timedelta
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
+
 from .models import *
+from .paginators import EstimatedCountPaginator
+from . import jobs, signals, tasks
+
+
+class DeferredPurgeAdmin(admin.ModelAdmin):
+    """
+    Удаление (и каскад по товарам и подкатегориям) шлёт сигнал на каждую
+    строку, поэтому сброс кеша копится и ставится одной задачей
+    """
+
+    def delete_model(self, request, obj):
+        with signals.purge_deferred():
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with signals.purge_deferred():
+            super().delete_queryset(request, queryset)
+
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'parent')  # Показываем название и родительскую категорию
+class CategoryAdmin(DeferredPurgeAdmin):
+    list_display = ('name', 'parent', 'products_link')  # Показываем название и родительскую категорию
+    list_select_related = ('parent',)
     prepopulated_fields = {'slug': ('name',)}  # Автозаполнение slug
-    autocomplete_fields = ['parent']  # Добавляем автодополнение для выбора родительской категории
+    autocomplete_fields = ['parent']  # Автодополнение по полному пути категории (main.sites)
     search_fields = ('name', 'parent__name')  # Поиск по имени категории и родительской категории
     ordering = ('name',)  # Сортировка категорий по имени в алфавитном порядке
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # Фильтр «есть родитель / корневая категория» вместо списка всех категорий
+    list_filter = (('parent', admin.EmptyFieldListFilter),)
+
+    @admin.display(description="Товары")
+    def products_link(self, obj):
+        url = reverse('admin:main_product_changelist') + f'?category__id__exact={obj.pk}'
+        return format_html('<a href="{}">Товары</a>', url)
 
-    # Добавляем фильтрацию категорий без родителя
-    list_filter = ('parent',)
 
-    # Переопределяем список категорий для показа
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        # Если нужен фильтр для категорий без родителя:
-        if request.GET.get('parent__isnull', None):
-            return queryset.filter(parent__isnull=True)
-        return queryset
+class ProductActionForm(ActionForm):
+    target_category = forms.CharField(
+        required=False,
+        label="Слаг категории",
+        help_text="Для действия «Перенести в категорию»",
+    )
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(DeferredPurgeAdmin):
     list_display = ('name', 'category', 'slug')
+    list_select_related = ('category',)
     prepopulated_fields = {'slug': ('name',)}
     autocomplete_fields = ['category']
-    search_fields = ('name', 'category__name')
-    ordering = ('name',)
-    
+    search_fields = ('name',)  # Триграммный индекс по UPPER(name), без JOIN на категории
+    # id в конце: иначе админка сама допишет -pk и индекс (name, id) не подойдёт
+    ordering = ('name', 'id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = ProductActionForm
+    actions = ['move_to_category', 'regenerate_slugs', 'regenerate_thumbnails']
+
+    def selected_ids(self, queryset):
+        return list(queryset.values_list('id', flat=True))
+
+    @admin.action(description="Перенести в категорию (фоном)")
+    def move_to_category(self, request, queryset):
+        slug = request.POST.get('target_category', '').strip()
+        category = Category.objects.filter(slug=slug).first() if slug else None
+        if category is None:
+            self.message_user(request, "Укажите слаг существующей категории", messages.ERROR)
+            return
+
+        ids = self.selected_ids(queryset)
+        tasks.move_products.enqueue(ids, category.id)
+        self.message_user(request, f"Перенос {len(ids)} товаров в «{category.name}» поставлен в очередь")
+
+    @admin.action(description="Пересоздать слаги (фоном)")
+    def regenerate_slugs(self, request, queryset):
+        ids = self.selected_ids(queryset)
+        tasks.regenerate_slugs.enqueue(ids)
+        self.message_user(request, f"Пересоздание слагов для {len(ids)} товаров поставлено в очередь")
+
+    @admin.action(description="Пересоздать миниатюры (фоном)")
+    def regenerate_thumbnails(self, request, queryset):
+        ids = self.selected_ids(queryset)
+        tasks.regenerate_thumbnails.enqueue(ids)
+        self.message_user(request, f"Пересоздание миниатюр для {len(ids)} товаров поставлено в очередь")
+
 
 @admin.register(Service)
-class ServiceAdmin(admin.ModelAdmin):
+class ServiceAdmin(DeferredPurgeAdmin):
     prepopulated_fields = {"slug": ("name",)}  # Автоматическое заполнение
-    list_display = ("name", "slug")
\ No newline at end of file
+    list_display = ("name", "slug")
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'duration', 'worker')
+    list_filter = ('status', 'name')
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = [field.name for field in Job._meta.fields]
+    actions = ['retry']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Повторить")
+    def retry(self, request, queryset):
+        # Unique-задачу не ставим второй раз, пока её копия ждёт или выполняется
+        active_keys = Job.objects.filter(status__in=Job.ACTIVE_STATUSES, unique_key__isnull=False).values('unique_key')
+        queryset = queryset.exclude(status=Job.RUNNING).exclude(
+            Q(unique_key__in=active_keys) & ~Q(status=Job.QUEUED)
+        )
+        try:
+            with transaction.atomic():
+                count = queryset.update(status=Job.QUEUED, attempts=0, run_at=timezone.now(), error='')
+        except IntegrityError:
+            self.message_user(request, "Среди выбранных есть копии одной unique-задачи, выберите одну", messages.ERROR)
+            return
+        self.message_user(request, f"Повторно поставлено в очередь: {count}")
+
+    def changelist_view(self, request, extra_context=None):
+        # Сводка по времени выполнения над списком задач
+        extra_context = {**(extra_context or {}), 'subtitle': self.stats_summary()}
+        return super().changelist_view(request, extra_context)
+
+    @staticmethod
+    def stats_summary():
+        parts = []
+        for name, entry in jobs.job_stats(timezone.now() - timedelta(hours=24)).items():
+            if entry['duration_avg'] is not None:
+                parts.append(f"{name.rsplit('.', 1)[-1]}: ~{entry['duration_avg']:.1f} с")
+        return "За сутки: " + ', '.join(parts) if parts else None
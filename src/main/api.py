@@ -0,0 +1,232 @@
+"""
+Read-only JSON API каталога для интеграций (вместо парсинга HTML-страниц).
+
+Все ответы строятся через .values() без создания экземпляров моделей
+и отдаются потоково через StreamingHttpResponse. Товары листаются курсором
+по id (без COUNT и OFFSET), параметр fields= ограничивает набор полей.
+"""
+import base64
+import binascii
+import json
+import re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+
+from .models import Category, Product
+from .utils import build_children_map, get_subtree_ids
+
+
+API_PAGE_SIZE = getattr(settings, 'CATALOG_API_PAGE_SIZE', 100)
+API_MAX_PAGE_SIZE = getattr(settings, 'CATALOG_API_MAX_PAGE_SIZE', 1000)
+STREAM_CHUNK_SIZE = 8192
+
+# Имя поля в ответе -> lookup для .values()
+CATEGORY_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'slug': 'slug',
+    'parent_id': 'parent_id',
+    'about': 'about',
+    'image': 'image',
+}
+
+PRODUCT_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'slug': 'slug',
+    'category_id': 'category_id',
+    'category_slug': 'category__slug',
+    'description': 'description',
+    'image': 'image',
+    'external_url': 'external_url',
+}
+
+DEFAULT_PRODUCT_FIELDS = ('id', 'name', 'slug', 'category_id', 'image')
+
+# Фильтры по характеристикам, которые распознаются в названии товара
+ATTRIBUTE_FILTERS = ('mark', 'gost', 'product_type')
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ApiError('Некорректный cursor')
+
+
+def parse_fields(request, available, default):
+    """ Разбираем fields=a,b,c и проверяем, что такие поля есть """
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(default)
+
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ApiError(f"Неизвестные поля: {', '.join(unknown)}")
+    return fields
+
+
+def parse_limit(request):
+    raw = request.GET.get('limit')
+    if not raw:
+        return API_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ApiError('Некорректный limit')
+    return max(1, min(limit, API_MAX_PAGE_SIZE))
+
+
+def serialize_row(row, fields, mapping):
+    item = {field: row[mapping[field]] for field in fields}
+    if item.get('image'):
+        item['image'] = default_storage.url(item['image'])
+    elif 'image' in item:
+        item['image'] = None
+    return item
+
+
+def chunked(parts, size=STREAM_CHUNK_SIZE):
+    """ Склеиваем мелкие куски JSON, чтобы не писать в сокет по одному символу """
+    buffer = []
+    buffered = 0
+    for part in parts:
+        buffer.append(part)
+        buffered += len(part)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def json_stream(parts):
+    return StreamingHttpResponse(chunked(parts), content_type='application/json; charset=utf-8')
+
+
+class CatalogApiView(View):
+    """ Базовое представление API: только GET, ошибки в виде JSON """
+    http_method_names = ['get', 'head', 'options']
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'error': error.message}, status=error.status)
+
+
+class CategoryTreeApiView(CatalogApiView):
+    """
+    Дерево категорий целиком (/api/categories/) или поддерево
+    от категории со слагом slug (/api/categories/<slug>/).
+    """
+
+    def get(self, request, slug=None):
+        fields = parse_fields(request, CATEGORY_FIELDS, ('id', 'name', 'slug'))
+        lookups = set(CATEGORY_FIELDS[field] for field in fields) | {'id', 'parent_id', 'slug'}
+
+        rows = {}
+        children_map = {}
+        for row in Category.objects.values(*lookups).order_by('name', 'id'):
+            rows[row['id']] = row
+            children_map.setdefault(row['parent_id'], []).append(row['id'])
+
+        if slug is None:
+            root_ids = children_map.get(None, [])
+        else:
+            root_ids = [row['id'] for row in rows.values() if row['slug'] == slug]
+            if not root_ids:
+                raise ApiError('Категория не найдена', status=404)
+
+        def build(category_id):
+            node = serialize_row(rows[category_id], fields, CATEGORY_FIELDS)
+            node['children'] = [build(child_id) for child_id in children_map.get(category_id, [])]
+            return node
+
+        encoder = json.JSONEncoder(ensure_ascii=False)
+        if slug is None:
+            payload = {'results': [build(root_id) for root_id in root_ids]}
+        else:
+            payload = build(root_ids[0])
+        return json_stream(encoder.iterencode(payload))
+
+
+class ProductApiView(CatalogApiView):
+    """
+    Список товаров с курсорной пагинацией.
+
+    Параметры:
+        category     — слаг категории, берутся товары всего поддерева;
+        mark, gost, product_type, thickness — характеристики из названия;
+        fields       — список полей через запятую;
+        cursor, limit — пагинация.
+    """
+
+    def get_queryset(self, request):
+        queryset = Product.objects.all()
+
+        category_slug = request.GET.get('category')
+        if category_slug:
+            category_id = Category.objects.filter(slug=category_slug).values_list('id', flat=True).first()
+            if category_id is None:
+                raise ApiError('Категория не найдена', status=404)
+            queryset = queryset.filter(category_id__in=get_subtree_ids(category_id, build_children_map()))
+
+        for attribute in ATTRIBUTE_FILTERS:
+            value = request.GET.get(attribute)
+            if value:
+                queryset = queryset.filter(name__contains=value)
+
+        thickness = request.GET.get('thickness')
+        if thickness:
+            queryset = queryset.filter(name__regex=rf'(^|[^0-9.]){re.escape(thickness)}\s*мм')
+
+        cursor = request.GET.get('cursor')
+        if cursor:
+            queryset = queryset.filter(id__gt=decode_cursor(cursor))
+
+        return queryset.order_by('id')
+
+    def get(self, request):
+        fields = parse_fields(request, PRODUCT_FIELDS, DEFAULT_PRODUCT_FIELDS)
+        limit = parse_limit(request)
+        lookups = set(PRODUCT_FIELDS[field] for field in fields) | {'id'}
+
+        # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+        rows = self.get_queryset(request).values(*lookups)[:limit + 1]
+        return json_stream(self.stream(rows.iterator(chunk_size=limit + 1), fields, limit))
+
+    def stream(self, rows, fields, limit):
+        encoder = json.JSONEncoder(ensure_ascii=False)
+        last_id = None
+        next_cursor = None
+
+        yield '{"results": ['
+        for count, row in enumerate(rows):
+            if count == limit:
+                next_cursor = encode_cursor(last_id)
+                break
+            if count:
+                yield ','
+            yield from encoder.iterencode(serialize_row(row, fields, PRODUCT_FIELDS))
+            last_id = row['id']
+        yield '], "next_cursor": '
+        yield encoder.encode(next_cursor)
+        yield '}'
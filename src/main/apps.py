@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.contrib.admin.apps import AdminConfig
 
 
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+
+class CatalogAdminConfig(AdminConfig):
+    """ Админка с автодополнением категорий по полному пути (main.sites.CatalogAdminSite) """
+    default_site = 'main.sites.CatalogAdminSite'
@@ -0,0 +1,323 @@
+"""
+Нагрузочные замеры страниц каталога.
+
+generate_catalog — детерминированный (по seed) генератор большого каталога:
+дерево категорий заданной глубины и товары с реалистичными названиями.
+Все созданные записи имеют слаг с префиксом BENCH_PREFIX, поэтому их
+можно удалить, не трогая настоящий каталог.
+
+run_scenarios — прогон сценариев (главная, каталог, глубокие страницы
+категорий, список товаров с фильтром, карточка товара, поиск) через
+django.test.Client с подсчётом запросов к базе.
+"""
+import math
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, Max, Min
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from .models import Category, Product
+from .signals import purge_deferred
+from .testing import CaptureAllQueries
+from .utils import get_subtree_ids
+
+
+BENCH_PREFIX = 'bench-'
+
+PRODUCT_KINDS = (
+    ('Лист', 'горячекатаная'), ('Лист', 'холоднокатаная'), ('Труба', None),
+    ('Труба профильная', None), ('Арматура', None), ('Уголок', None),
+    ('Швеллер', None), ('Балка', None), ('Круг', None), ('Полоса', None),
+)
+STEEL_MARKS = ('Ст3сп', 'Ст3пс', 'Ст08кп', 'Ст10', 'Ст20', 'Ст45', '09Г2С', '12Х18Н10Т', 'AISI 304')
+GOSTS = ('ГОСТ 19903-74', 'ГОСТ 19904-90', 'ГОСТ 8732-78', 'ГОСТ 8734-75', 'ГОСТ 10704-91',
+         'ГОСТ 8509-93', 'ГОСТ 8240-97', 'ГОСТ 2590-2006', 'ГОСТ 5781-82', 'ГОСТ 103-2006')
+THICKNESSES = (0.5, 0.8, 1, 1.5, 2, 2.5, 3, 4, 5, 6, 8, 10, 12, 14, 16, 20, 25, 30, 40, 50)
+CATEGORY_WORDS = ('Листовой прокат', 'Трубный прокат', 'Сортовой прокат', 'Фасонный прокат',
+                  'Нержавеющая сталь', 'Оцинкованная сталь', 'Метизы', 'Арматура', 'Профили')
+
+PERCENTILES = (50, 90, 99)
+
+
+def product_name(rng):
+    kind, rolling = rng.choice(PRODUCT_KINDS)
+    thickness = rng.choice(THICKNESSES)
+    parts = [kind]
+    if rolling:
+        parts.append(rolling)
+    if kind.startswith('Труба'):
+        parts.append(f'{rng.randint(10, 530)}х{thickness} мм')
+    else:
+        parts.append(f'{thickness} мм')
+    parts.append(rng.choice(STEEL_MARKS))
+    parts.append(rng.choice(GOSTS))
+    return ' '.join(parts)
+
+
+def generate_catalog(categories, products, depth=3, seed=0, batch_size=5000, stdout=None):
+    """
+    Создаёт categories категорий глубиной depth и products товаров в листовых
+    категориях. При одинаковом seed каталог получается одинаковым.
+    """
+    rng = random.Random(seed)
+    branching = max(2, math.ceil(categories ** (1 / max(depth, 1))))
+    created = 0
+    parents = [None]
+    all_categories = []
+    parent_ids = set()
+
+    with transaction.atomic():
+        for _ in range(depth):
+            level_objects = []
+            for parent in parents:
+                for _ in range(branching):
+                    if created >= categories:
+                        break
+                    created += 1
+                    level_objects.append(Category(
+                        name=f'{rng.choice(CATEGORY_WORDS)} {created}',
+                        slug=f'{BENCH_PREFIX}c-{created}',
+                        parent=parent,
+                    ))
+                    if parent is not None:
+                        parent_ids.add(parent.id)
+            if not level_objects:
+                break
+            parents = Category.objects.bulk_create(level_objects, batch_size=batch_size)
+            all_categories.extend(parents)
+
+        # Товары кладём только в листовые категории, как в настоящем каталоге
+        leaves = [category for category in all_categories if category.id not in parent_ids]
+        if stdout:
+            stdout.write(f"Категорий создано: {created}, листовых: {len(leaves)}")
+
+        batch = []
+        for number in range(1, products + 1):
+            batch.append(Product(
+                name=product_name(rng),
+                slug=f'{BENCH_PREFIX}p-{number}',
+                category=rng.choice(leaves),
+                image='products/bench.jpg',
+            ))
+            if len(batch) >= batch_size:
+                Product.objects.bulk_create(batch)
+                batch = []
+                if stdout:
+                    stdout.write(f"Товаров создано: {number}")
+        if batch:
+            Product.objects.bulk_create(batch)
+
+    return created, products
+
+
+def purge_catalog():
+    """ Удаляет всё, что создал generate_catalog (товары удалятся каскадом) """
+    with purge_deferred():
+        return Category.objects.filter(slug__startswith=BENCH_PREFIX).delete()
+
+
+class ScenarioContext:
+    """ Данные для сценариев: слаги и номера страниц, выбираются один раз """
+
+    def __init__(self, rng):
+        self.rng = rng
+        category_rows = list(Category.objects.values_list('id', 'slug', 'parent_id'))
+        children_map = defaultdict(list)
+        for cat_id, _, parent_id in category_rows:
+            children_map[parent_id].append(cat_id)
+        self.branch_slugs = [slug for cat_id, slug, _ in category_rows if cat_id in children_map] or [None]
+        self.leaf_slugs = [slug for cat_id, slug, _ in category_rows if cat_id not in children_map] or [None]
+
+        # Товаров в поддереве каждой ветки: по ним считается последняя страница категории
+        category_counts = dict(Product.objects.order_by().values_list('category_id').annotate(Count('id')))
+        self.product_count = sum(category_counts.values())
+        self.subtree_counts = {
+            slug: sum(category_counts.get(sub_id, 0) for sub_id in get_subtree_ids(cat_id, children_map))
+            for cat_id, slug, _ in category_rows if cat_id in children_map
+        }
+
+        # Выборка товаров зависит только от seed: случайные id из диапазона
+        bounds = Product.objects.aggregate(low=Min('id'), high=Max('id'))
+        sample_ids = [rng.randint(bounds['low'], bounds['high']) for _ in range(1000)] if self.product_count else []
+        self.product_rows = list(
+            Product.objects.filter(id__in=sample_ids).order_by('id').values_list('slug', 'name')
+        ) or list(Product.objects.order_by('id').values_list('slug', 'name')[:1000])
+
+    def product(self):
+        return self.rng.choice(self.product_rows)
+
+
+def scenario_index(ctx):
+    return reverse('main:index'), {}
+
+
+def scenario_catalog(ctx):
+    return reverse('main:category'), {}
+
+
+def scenario_category_deep_page(ctx):
+    slug = ctx.rng.choice(ctx.branch_slugs)
+    # Далёкие страницы пагинации: OFFSET растёт вместе с каталогом
+    last_page = max(1, math.ceil(ctx.subtree_counts.get(slug, 0) / 15))
+    page = ctx.rng.randint(max(1, last_page // 2), last_page)
+    return reverse('main:category_detail', kwargs={'slug': slug}) + f'?page={page}', {}
+
+
+def scenario_product_list_filtered(ctx):
+    slug = ctx.rng.choice(ctx.leaf_slugs)
+    term = ctx.rng.choice(STEEL_MARKS)
+    return reverse('main:product_list', kwargs={'slug': slug}) + f'?search={term}', {}
+
+
+def scenario_product_detail(ctx):
+    slug, _ = ctx.product()
+    return reverse('main:product_detail', kwargs={'slug': slug}), {}
+
+
+def scenario_search_typeahead(ctx):
+    _, name = ctx.product()
+    # Имитируем набор текста: первые 3-6 символов названия
+    return reverse('main:search_products') + f'?query={name[:ctx.rng.randint(3, 6)]}', {
+        'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest',
+    }
+
+
+SCENARIOS = {
+    'index': scenario_index,
+    'catalog': scenario_catalog,
+    'category_deep_page': scenario_category_deep_page,
+    'product_list_filtered': scenario_product_list_filtered,
+    'product_detail': scenario_product_detail,
+    'search_typeahead': scenario_search_typeahead,
+}
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+# Замеры идут через django.test.Client (хост testserver): без кеша nginx,
+# чтобы не засорять его индекс записями EdgeCacheEntry для testserver
+@override_settings(EDGE_CACHE_ENABLED=False)
+def run_scenario(name, ctx, requests, concurrency=1, warmup=0, clear_cache=False):
+    """ Прогоняет сценарий и возвращает throughput, перцентили задержки и число запросов к БД """
+    build_request = SCENARIOS[name]
+    if clear_cache:
+        cache.clear()
+
+    plan = [build_request(ctx) for _ in range(warmup + requests)]
+    warmup_plan, plan = plan[:warmup], plan[warmup:]
+    latencies = []
+    query_counts = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(items):
+        nonlocal errors
+        client = Client(raise_request_exception=False)
+        for url, headers in items:
+            # Запросы ко всем базам: на чтение страницы могут идти к репликам
+            with CaptureAllQueries() as queries:
+                start = time.perf_counter()
+                response = client.get(url, **headers)
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed * 1000)
+                query_counts.append(len(queries))
+                if response.status_code >= 500:
+                    errors += 1
+
+    def thread_worker(items):
+        try:
+            worker(items)
+        finally:
+            # У каждого потока свои подключения к базам, закрываем их за собой
+            connections.close_all()
+
+    client = Client(raise_request_exception=False)
+    for url, headers in warmup_plan:
+        client.get(url, **headers)
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        worker(plan)
+    else:
+        threads = [threading.Thread(target=thread_worker, args=(plan[index::concurrency],)) for index in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    wall_time = time.perf_counter() - started
+
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+        'latency_ms_mean': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        'queries_mean': round(statistics.fmean(query_counts), 2) if query_counts else 0.0,
+        'queries_max': max(query_counts, default=0),
+    }
+    for percent in PERCENTILES:
+        result[f'latency_ms_p{percent}'] = round(percentile(latencies, percent), 2)
+    return result
+
+
+def run_scenarios(names, requests, concurrency=1, warmup=0, seed=0, clear_cache=False):
+    ctx = ScenarioContext(random.Random(seed))
+    return {
+        'catalog': {
+            'categories': Category.objects.count(),
+            'products': ctx.product_count,
+        },
+        'settings': {
+            'requests': requests,
+            'concurrency': concurrency,
+            'warmup': warmup,
+            'seed': seed,
+        },
+        'scenarios': {
+            name: run_scenario(name, ctx, requests, concurrency, warmup, clear_cache)
+            for name in names
+        },
+    }
+
+
+# Метрики, по которым сравниваем с базовой линией: рост — это регрессия
+COMPARED_METRICS = ('latency_ms_p50', 'latency_ms_p90', 'latency_ms_p99', 'queries_mean', 'queries_max')
+
+
+def compare_with_baseline(results, baseline, threshold=0.2):
+    """
+    Сравнивает результаты с базовой линией. Возвращает список строк-отчётов
+    и список регрессий (метрика выросла больше чем на threshold, для числа
+    запросов — любой рост).
+    """
+    report = []
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            report.append(f'{name}: нет в базовой линии')
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = previous.get(metric, 0), current.get(metric, 0)
+            change = (new - old) / old if old else (1.0 if new else 0.0)
+            line = f'{name}.{metric}: {old} -> {new} ({change:+.0%})'
+            report.append(line)
+            limit = 0 if metric.startswith('queries') else threshold
+            if change > limit:
+                regressions.append(line)
+    return report, regressions
@@ -0,0 +1,193 @@
+"""
+Полностраничный кеш для анонимных посетителей на стороне nginx (proxy_cache).
+
+Представления помечают ответ тегами (tag_response / CacheTagsMixin):
+«product-12», «category-5», «catalog» и т.п. EdgeCacheMiddleware для
+анонимных GET-ответов выставляет X-Accel-Expires (nginx кладёт страницу в
+кеш), заголовок Cache-Tag и запоминает, какие адреса каким тегам
+соответствуют. При изменении товара/категории/услуги purge_cache_tags()
+перезапрашивает у nginx ровно эти адреса с заголовком X-Cache-Refresh,
+и nginx обновляет записи в кеше (proxy_cache_bypass).
+
+Индекс «тег -> адреса» хранится в таблице EdgeCacheEntry: он общий для
+всех веб-процессов и воркера, а регистрация адреса — атомарный upsert.
+Кешируются только адреса без параметров или с параметрами из
+CACHEABLE_QUERY_PARAMS, иначе utm-метки и поиск плодили бы варианты.
+
+category_tags() сбрасывает и выборки товаров категорий в django cache,
+поэтому CACHES должен быть общим для веб-процессов и воркера (не LocMemCache).
+"""
+import logging
+import re
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+
+from .models import Category, EdgeCacheEntry
+
+
+logger = logging.getLogger(__name__)
+
+# Параметр -> допустимое значение. Адреса с другими параметрами (utm_*, поиск)
+# и с неканоничной записью (page=02, повторы) в nginx не кешируются
+CACHEABLE_QUERY_PARAMS = {
+    'page': re.compile(r'[1-9]\d{0,4}'),
+}
+MAX_PATH_LENGTH = EdgeCacheEntry._meta.get_field('path').max_length
+REFRESH_HEADER = 'X-Cache-Refresh'
+PURGE_TIMEOUT = 10
+
+
+def tag_response(request, *tags):
+    """ Добавляет теги кеша к текущему запросу (их соберёт EdgeCacheMiddleware) """
+    if not hasattr(request, 'cache_tags'):
+        request.cache_tags = set()
+    request.cache_tags.update(tag for tag in tags if tag)
+
+
+class CacheTagsMixin:
+    """ Для CBV: теги из get_cache_tags() вешаются на ответ """
+
+    def get_cache_tags(self):
+        return []
+
+    def render_to_response(self, context, **response_kwargs):
+        tag_response(self.request, *self.get_cache_tags())
+        return super().render_to_response(context, **response_kwargs)
+
+
+def is_ajax(request):
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+def has_cacheable_query(request):
+    """ Нет параметров или только параметры из CACHEABLE_QUERY_PARAMS, по одному разу и по алфавиту """
+    query = request.META.get('QUERY_STRING', '')
+    if not query:
+        return True
+    params = [param.partition('=') for param in query.split('&')]
+    names = [name for name, _, _ in params]
+    if names != sorted(set(names)):
+        return False
+    for name, _, value in params:
+        pattern = CACHEABLE_QUERY_PARAMS.get(name)
+        if pattern is None or not pattern.fullmatch(value):
+            return False
+    return True
+
+
+def is_cacheable(request, response):
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+        return False
+    if response.streaming or response.cookies:
+        return False
+    if len(request.get_full_path()) > MAX_PATH_LENGTH or not has_cacheable_query(request):
+        return False
+    # Без сессии пользователь анонимный. request.user не трогаем: обращение
+    # к сессии добавило бы Vary: Cookie и разбило кеш на варианты по cookie
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def register_url(request, tags):
+    """ Запоминаем адрес страницы под каждым её тегом, чтобы потом обновить точечно """
+    # Теги живут дольше страниц в nginx, чтобы не потерять адрес до его истечения
+    expires_at = timezone.now() + timedelta(seconds=settings.EDGE_CACHE_TTL * 2)
+    host, path, ajax = request.get_host(), request.get_full_path(), is_ajax(request)
+    EdgeCacheEntry.objects.bulk_create(
+        [EdgeCacheEntry(tag=tag, host=host, path=path, ajax=ajax, expires_at=expires_at) for tag in sorted(tags)],
+        update_conflicts=True,
+        unique_fields=['tag', 'host', 'path', 'ajax'],
+        update_fields=['expires_at'],
+    )
+
+
+def remove_expired_entries():
+    """ Удаляет адреса, которых уже нет в кеше nginx """
+    deleted, _ = EdgeCacheEntry.objects.filter(expires_at__lt=timezone.now()).delete()
+    return deleted
+
+
+def category_tags(*category_ids):
+    """ Теги категорий и всех их предков: страницы предков показывают товары поддерева """
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    tags = set()
+    for category_id in category_ids:
+        while category_id is not None and f'category-{category_id}' not in tags:
+            tags.add(f'category-{category_id}')
+            category_id = parents.get(category_id)
+    return tags
+
+
+def purge_cache_tags(tags):
+    """
+    Обновляет в nginx все закешированные страницы с этими тегами.
+    Возвращает число отправленных запросов.
+    """
+    tagged = EdgeCacheEntry.objects.filter(tag__in=set(tags))
+    entries = set(tagged.filter(expires_at__gte=timezone.now()).values_list('host', 'path', 'ajax'))
+    # Обновлённые страницы зарегистрируются заново, когда nginx запросит их у Django
+    tagged.delete()
+    remove_expired_entries()
+
+    purge_url = getattr(settings, 'EDGE_CACHE_PURGE_URL', None)
+    if not purge_url or not entries:
+        return 0
+
+    refreshed = 0
+    with requests.Session() as session:
+        for host, path, ajax in sorted(entries):
+            headers = {'Host': host, REFRESH_HEADER: '1'}
+            if ajax:
+                headers['X-Requested-With'] = 'XMLHttpRequest'
+            try:
+                session.get(purge_url.rstrip('/') + path, headers=headers, timeout=PURGE_TIMEOUT)
+                refreshed += 1
+            except requests.RequestException:
+                logger.warning("Не удалось обновить кеш nginx для %s%s", host, path, exc_info=True)
+    return refreshed
+
+
+class EdgeCacheMiddleware:
+    """
+    Помечает ответы для кеша nginx. Кешируются только анонимные GET-ответы
+    со статусом 200, у которых представление выставило теги и которые
+    не ставят cookie.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'EDGE_CACHE_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        tags = getattr(request, 'cache_tags', None)
+        if tags:
+            # AJAX-версия страницы отличается от полной, nginx учитывает это в ключе
+            patch_vary_headers(response, ['X-Requested-With'])
+
+        if tags and is_cacheable(request, response) and self.register(request, tags):
+            response['Cache-Tag'] = ' '.join(sorted(tags))
+            response['X-Accel-Expires'] = str(settings.EDGE_CACHE_TTL)
+        elif request.headers.get(REFRESH_HEADER) == '1' and not response.cookies:
+            # Страница удалена или стала редиректом: nginx заменит старую копию
+            # на ответ, который сразу истечёт, иначе устаревшая копия осталась бы в кеше
+            response['X-Accel-Expires'] = '1'
+        elif tags:
+            response['X-Accel-Expires'] = '0'
+        return response
+
+    def register(self, request, tags):
+        try:
+            register_url(request, tags)
+        except DatabaseError:
+            # Без записи в индексе страницу потом не сбросить, поэтому не кешируем её
+            logger.warning("Не удалось зарегистрировать %s в кеше nginx", request.get_full_path(), exc_info=True)
+            return False
+        return True
@@ -0,0 +1,251 @@
+"""
+Выгрузка каталога товаров для маркетплейсов и прайс-листов.
+
+Товары читаются серверным курсором (.iterator(chunk_size=...)) и сразу
+пишутся в файл, поэтому память не зависит от размера каталога. Файлы
+собирает фоновая задача main.tasks.rebuild_export (или manage.py
+export_catalog) в EXPORT_ROOT, а ProductExportView только отдаёт готовый
+файл — через nginx (X-Accel-Redirect) или FileResponse.
+Форматы:
+    csv   — обычный CSV (разделитель «,», UTF-8);
+    excel — CSV для Excel (разделитель «;», UTF-8 с BOM);
+    yml   — XML в формате Яндекс YML.
+"""
+import csv
+import hashlib
+import os
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import quote_etag
+from django.views import View
+
+from . import tasks
+from .models import Category, Product
+from .utils import atomic_write, build_category_paths, file_lock, parse_product_name, site_url, slug_url_builder
+
+
+EXPORT_CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+CSV_HEADER = [
+    'id', 'Название', 'Категория', 'Толщина', 'Марка', 'ГОСТ', 'Тип проката',
+    'Ссылка', 'Картинка', 'Описание',
+]
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'products.csv'),
+    'excel': ('text/csv; charset=utf-8', 'products-excel.csv'),
+    'yml': ('application/xml; charset=utf-8', 'products.yml'),
+}
+
+
+class Echo:
+    """ Псевдо-файл для csv.writer: возвращает строку вместо записи """
+
+    def write(self, value):
+        return value
+
+
+def image_url(name):
+    return site_url(default_storage.url(name)) if name else ''
+
+
+def iter_products():
+    return (
+        Product.objects.order_by('id')
+        .values_list('id', 'name', 'slug', 'category_id', 'image', 'description')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def catalog_etag(export_format):
+    """
+    ETag выгрузки. Считается двумя агрегатными запросами: любое добавление,
+    удаление или изменение товара/категории меняет результат.
+    """
+    products = Product.objects.aggregate(count=Count('id'), last_id=Max('id'), updated=Max('updated_at'))
+    categories = Category.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    state = f"{export_format}:{products}:{categories}"
+    return hashlib.md5(state.encode()).hexdigest()
+
+
+def iter_csv(dialect='csv'):
+    """ Строки CSV по одной, с путём категории и характеристиками из названия """
+    writer_kwargs = {'delimiter': ';'} if dialect == 'excel' else {}
+    writer = csv.writer(Echo(), **writer_kwargs)
+    category_paths = build_category_paths()
+    product_url = slug_url_builder('main:product_detail')
+
+    if dialect == 'excel':
+        yield '\ufeff'
+    yield writer.writerow(CSV_HEADER)
+
+    for product_id, name, slug, category_id, image, description in iter_products():
+        parsed = parse_product_name(name)
+        yield writer.writerow([
+            product_id,
+            name,
+            category_paths.get(category_id, ''),
+            parsed['thickness'],
+            parsed['mark'],
+            parsed['gost'],
+            parsed['product_type'],
+            product_url(slug) if slug else '',
+            image_url(image),
+            description,
+        ])
+
+
+def iter_yml():
+    """ Фид в формате YML: сначала дерево категорий, затем offers по одному """
+    product_url = slug_url_builder('main:product_detail')
+    shop_name = escape(settings.SHOP_NAME)
+
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield f'<yml_catalog date="{timezone.localtime():%Y-%m-%dT%H:%M:%S%z}">\n<shop>\n'
+    yield f'<name>{shop_name}</name>\n<company>{shop_name}</company>\n'
+    yield f'<url>{escape(settings.SITE_URL)}</url>\n'
+    yield f'<currencies><currency id="{settings.SHOP_CURRENCY}" rate="1"/></currencies>\n'
+
+    yield '<categories>\n'
+    for cat_id, name, parent_id in Category.objects.order_by('id').values_list('id', 'name', 'parent_id'):
+        parent = f' parentId="{parent_id}"' if parent_id else ''
+        yield f'<category id="{cat_id}"{parent}>{escape(name)}</category>\n'
+    yield '</categories>\n'
+
+    yield '<offers>\n'
+    for product_id, name, slug, category_id, image, description in iter_products():
+        parts = [f'<offer id="{product_id}" available="true">']
+        if slug:
+            parts.append(f'<url>{escape(product_url(slug))}</url>')
+        parts.append(f'<currencyId>{settings.SHOP_CURRENCY}</currencyId>')
+        parts.append(f'<categoryId>{category_id}</categoryId>')
+        if image:
+            parts.append(f'<picture>{escape(image_url(image))}</picture>')
+        parts.append(f'<name>{escape(name)}</name>')
+        if description:
+            parts.append(f'<description>{escape(description)}</description>')
+        parsed = parse_product_name(name)
+        for param_name, value in (
+            ('Толщина', parsed['thickness']),
+            ('Марка', parsed['mark']),
+            ('ГОСТ', parsed['gost']),
+        ):
+            if not value.startswith('Не указано'):
+                parts.append(f'<param name={quoteattr(param_name)}>{escape(value)}</param>')
+        parts.append('</offer>\n')
+        yield ''.join(parts)
+    yield '</offers>\n</shop>\n</yml_catalog>\n'
+
+
+def iter_export(export_format):
+    if export_format == 'yml':
+        return iter_yml()
+    return iter_csv(dialect=export_format)
+
+
+def export_path(export_format, root=None):
+    return os.path.join(root or settings.EXPORT_ROOT, EXPORT_FORMATS[export_format][1])
+
+
+def read_etag(path):
+    """ ETag, с которым собран файл выгрузки, или None, если файла нет """
+    try:
+        with open(f'{path}.etag', encoding='utf-8') as file:
+            etag = file.read().strip()
+    except OSError:
+        return None
+    return etag if etag and os.path.exists(path) else None
+
+
+def is_rebuilding(path):
+    """ Файл выгрузки прямо сейчас пересобирается """
+    try:
+        with file_lock(path, blocking=False):
+            return False
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+
+
+def write_export(export_format, output=None, force=False):
+    """
+    Собирает файл выгрузки, если каталог изменился с прошлой сборки.
+    Возвращает True, если файл пересобран.
+    """
+    output = os.path.abspath(output or export_path(export_format))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+
+    with file_lock(output):
+        # ETag проверяем уже под блокировкой: пока ждали, файл мог собрать другой воркер
+        etag = catalog_etag(export_format)
+        if not force and read_etag(output) == etag:
+            return False
+
+        with atomic_write(output, encoding='utf-8', newline='') as file:
+            for chunk in iter_export(export_format):
+                file.write(chunk)
+        with atomic_write(f'{output}.etag', encoding='utf-8') as file:
+            file.write(etag)
+    return True
+
+
+def has_export_access(request):
+    """ Сотрудники — всегда, маркетплейсы — по ?token=EXPORT_TOKEN """
+    if request.user.is_staff:
+        return True
+    token = getattr(settings, 'EXPORT_TOKEN', '')
+    return bool(token) and constant_time_compare(request.GET.get('token', ''), token)
+
+
+class ProductExportView(View):
+    """
+    Отдаёт готовый файл выгрузки. Если каталог изменился, ставит пересборку
+    в очередь и пока отдаёт предыдущий файл; клиент с If-None-Match
+    получает 304. Пока файла нет совсем — 503 с Retry-After.
+    """
+    http_method_names = ['get', 'head']
+    retry_after = 60
+
+    def get(self, request, export_format):
+        if export_format not in EXPORT_FORMATS:
+            raise Http404("Неизвестный формат выгрузки")
+        if not has_export_access(request):
+            raise PermissionDenied
+
+        path = export_path(export_format)
+        etag = read_etag(path)
+        if etag != catalog_etag(export_format) and not is_rebuilding(path):
+            tasks.rebuild_export.enqueue(export_format)
+        if etag is None:
+            response = HttpResponse("Выгрузка готовится, повторите запрос позже", status=503,
+                                    content_type='text/plain; charset=utf-8')
+            response['Retry-After'] = str(self.retry_after)
+            return response
+
+        etag = quote_etag(etag)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = self.file_response(export_format, path)
+        response['ETag'] = etag
+        return response
+
+    def file_response(self, export_format, path):
+        content_type, filename = EXPORT_FORMATS[export_format]
+        accel_prefix = getattr(settings, 'EXPORT_ACCEL_REDIRECT', '')
+        if accel_prefix:
+            # Файл отдаёт nginx из internal-location, воркер Django не занят
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + filename
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
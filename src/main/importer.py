@@ -0,0 +1,65 @@
+"""
+Импорт каталога из JSON-выгрузки (response.txt): дерево категорий
+в разделе 'main' и товары в разделе 'products'.
+
+Запускается фоновой задачей main.tasks.import_catalog
+(manage.py import_catalog) или вручную скриптом fill_data_from_response.py.
+"""
+import json
+import logging
+
+from . import signals
+from .models import Category, Product
+
+
+logger = logging.getLogger(__name__)
+
+
+def create_categories(categories, parent=None):
+    """ Рекурсивно создаёт категории. Возвращает число новых. """
+    created_count = 0
+    for category in categories:
+        cat_obj, created = Category.objects.get_or_create(
+            name=category['name_plural'],
+            slug=category['slug'],
+            parent=parent
+        )
+        if created:
+            created_count += 1
+            logger.info("Создана категория: %s", cat_obj.name)
+
+        # Рекурсивно обрабатываем вложенные категории
+        if category.get('children'):
+            created_count += create_categories(category['children'], parent=cat_obj)
+    return created_count
+
+
+def create_products(products):
+    """ Создаёт товары в существующих категориях. Возвращает число новых. """
+    categories = dict(Category.objects.values_list('slug', 'id'))
+    created_count = 0
+    for product in products:
+        category_id = categories.get(product['category_slug'])
+        if category_id:
+            prod_obj, created = Product.objects.get_or_create(
+                name=product['name'],
+                slug=product['slug'],
+                description=product.get('description', ''),
+                category_id=category_id
+            )
+            if created:
+                created_count += 1
+                logger.info("Создан продукт: %s", prod_obj.name)
+    return created_count
+
+
+def import_catalog(path):
+    """ Возвращает {'categories': новых категорий, 'products': новых товаров} """
+    with open(path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+
+    # Кеш страниц сбрасываем один раз после импорта, а не на каждую строку
+    with signals.purge_deferred():
+        categories = create_categories(data.get('main', []))
+        products = create_products(data.get('products', []))
+    return {'categories': categories, 'products': products}
@@ -0,0 +1,355 @@
+"""
+Инструментация запросов: сколько SQL-запросов и времени уходит на каждую
+страницу, сколько занимает рендер шаблонов (всего, по каждому шаблону и
+по каждому {% block %}) и как работает кеш.
+
+InstrumentationMiddleware собирает метрики текущего запроса, добавляет
+заголовок Server-Timing (только сотрудникам) и копит гистограммы по каждому
+представлению (см. registry.snapshot() и представление metrics_view).
+"""
+import heapq
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+from django.template.base import Template
+from django.template.loader_tags import BlockNode
+
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+_current_metrics = ContextVar('request_metrics', default=None)
+_MISSING = object()
+
+
+class RequestMetrics:
+    """ Метрики одного HTTP-запроса """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_depth = 0
+        self.cache_depth = 0
+        # Время с вложенными шаблонами/блоками, поэтому сумма больше template_time
+        self.templates = defaultdict(float)
+        self.blocks = defaultdict(float)
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+
+def get_current_metrics():
+    return _current_metrics.get()
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """ Обёртка для connection.execute_wrapper: считает запросы и их время """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.query_time += time.perf_counter() - start
+
+
+def instrument_templates():
+    """
+    Оборачиваем Template.render, Template._render и BlockNode.render.
+    Общее время считаем только у внешнего рендера: {% include %} внутри уже
+    входит в него. По шаблонам (включая родителей {% extends %}) и блокам
+    время копится отдельно.
+    """
+    if getattr(Template.render, 'instrumented', False):
+        return
+
+    original_render = Template.render
+    original_template_render = Template._render
+    original_block_render = BlockNode.render
+
+    def render(self, context):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return original_render(self, context)
+
+        metrics.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            metrics.template_depth -= 1
+            if metrics.template_depth == 0:
+                metrics.template_time += time.perf_counter() - start
+
+    def template_render(self, context):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return original_template_render(self, context)
+
+        start = time.perf_counter()
+        try:
+            return original_template_render(self, context)
+        finally:
+            metrics.templates[self.origin.template_name or self.name or '<string>'] += time.perf_counter() - start
+
+    def block_render(self, context):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return original_block_render(self, context)
+
+        start = time.perf_counter()
+        try:
+            return original_block_render(self, context)
+        finally:
+            metrics.blocks[self.name] += time.perf_counter() - start
+
+    render.instrumented = True
+    Template.render = render
+    Template._render = template_render
+    BlockNode.render = block_render
+
+
+def instrument_cache_backend(backend_class):
+    """
+    Считаем попадания/промахи в get() и get_many() класса бэкенда кеша.
+    Одни методы бэкенда вызывают другие (BaseCache.get_many — get(),
+    DatabaseCache.get — get_many()), поэтому считаем только внешний вызов.
+    """
+    if getattr(backend_class.get, 'instrumented', False):
+        return
+
+    original_get = backend_class.get
+    original_get_many = backend_class.get_many
+
+    def get(self, key, default=None, version=None):
+        metrics = _current_metrics.get()
+        if metrics is None or metrics.cache_depth:
+            return original_get(self, key, default, version=version)
+
+        metrics.cache_depth += 1
+        try:
+            value = original_get(self, key, _MISSING, version=version)
+        finally:
+            metrics.cache_depth -= 1
+        if value is _MISSING:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+
+    def get_many(self, keys, version=None):
+        metrics = _current_metrics.get()
+        if metrics is None or metrics.cache_depth:
+            return original_get_many(self, keys, version=version)
+
+        keys = list(keys)
+        metrics.cache_depth += 1
+        try:
+            result = original_get_many(self, keys, version=version)
+        finally:
+            metrics.cache_depth -= 1
+        metrics.cache_hits += len(result)
+        metrics.cache_misses += len(keys) - len(result)
+        return result
+
+    get.instrumented = True
+    backend_class.get = get
+    backend_class.get_many = get_many
+
+
+@contextmanager
+def measure(metrics):
+    """ Метрики текущего запроса и execute_wrapper на всех подключениях """
+    token = _current_metrics.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(query_wrapper))
+            yield
+    finally:
+        _current_metrics.reset(token)
+
+
+class ViewStatsRegistry:
+    """
+    Гистограммы по представлениям внутри процесса:
+    время ответа (мс) и количество SQL-запросов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view_name, metrics, duration):
+        duration_ms = duration * 1000
+        with self._lock:
+            stats = self._views.get(view_name)
+            if stats is None:
+                stats = self._views[view_name] = {
+                    'count': 0,
+                    'latency_ms_sum': 0.0,
+                    'latency_ms_max': 0.0,
+                    'latency_ms_buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                    'queries_sum': 0,
+                    'queries_max': 0,
+                    'queries_buckets': [0] * (len(QUERY_BUCKETS) + 1),
+                    'query_ms_sum': 0.0,
+                    'template_ms_sum': 0.0,
+                    'templates_ms_sum': defaultdict(float),
+                    'blocks_ms_sum': defaultdict(float),
+                    'cache_hits': 0,
+                    'cache_misses': 0,
+                }
+            stats['count'] += 1
+            stats['latency_ms_sum'] += duration_ms
+            stats['latency_ms_max'] = max(stats['latency_ms_max'], duration_ms)
+            stats['latency_ms_buckets'][_bucket_index(LATENCY_BUCKETS_MS, duration_ms)] += 1
+            stats['queries_sum'] += metrics.queries
+            stats['queries_max'] = max(stats['queries_max'], metrics.queries)
+            stats['queries_buckets'][_bucket_index(QUERY_BUCKETS, metrics.queries)] += 1
+            stats['query_ms_sum'] += metrics.query_time * 1000
+            stats['template_ms_sum'] += metrics.template_time * 1000
+            for name, seconds in metrics.templates.items():
+                stats['templates_ms_sum'][name] += seconds * 1000
+            for name, seconds in metrics.blocks.items():
+                stats['blocks_ms_sum'][name] += seconds * 1000
+            stats['cache_hits'] += metrics.cache_hits
+            stats['cache_misses'] += metrics.cache_misses
+
+    def snapshot(self):
+        with self._lock:
+            views = {name: dict(stats, latency_ms_buckets=list(stats['latency_ms_buckets']),
+                                queries_buckets=list(stats['queries_buckets']),
+                                templates_ms_sum=dict(stats['templates_ms_sum']),
+                                blocks_ms_sum=dict(stats['blocks_ms_sum']))
+                     for name, stats in self._views.items()}
+        return {
+            'latency_ms_bounds': list(LATENCY_BUCKETS_MS) + ['+Inf'],
+            'queries_bounds': list(QUERY_BUCKETS) + ['+Inf'],
+            'views': views,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+def _bucket_index(bounds, value):
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            return index
+    return len(bounds)
+
+
+registry = ViewStatsRegistry()
+
+
+def _slowest(timings, top):
+    return heapq.nlargest(top, timings.items(), key=lambda item: item[1])
+
+
+def server_timing(metrics, duration, template_top=0):
+    entries = [
+        f'db;dur={metrics.query_time * 1000:.1f};desc="{metrics.queries} queries"',
+        f'tpl;dur={metrics.template_time * 1000:.1f}',
+    ]
+    # Имена шаблонов и блоков идут в desc: в имени метрики допустим только token
+    for index, (name, seconds) in enumerate(_slowest(metrics.templates, template_top), 1):
+        entries.append(f'tpl-{index};dur={seconds * 1000:.1f};desc="{name}"')
+    for index, (name, seconds) in enumerate(_slowest(metrics.blocks, template_top), 1):
+        entries.append(f'block-{index};dur={seconds * 1000:.1f};desc="{name}"')
+    entries += [
+        f'cache;desc="hit={metrics.cache_hits} miss={metrics.cache_misses}"',
+        f'total;dur={duration * 1000:.1f}',
+    ]
+    return ', '.join(entries)
+
+
+class InstrumentationMiddleware:
+    """
+    Считает SQL-запросы (через execute_wrapper на всех подключениях),
+    время рендера шаблонов и обращения к кешу для каждого запроса.
+    Включается настройкой INSTRUMENTATION_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'INSTRUMENTATION_SERVER_TIMING', True)
+        self.template_top = getattr(settings, 'INSTRUMENTATION_TEMPLATE_TOP', 5)
+
+        instrument_templates()
+        for alias in settings.CACHES:
+            instrument_cache_backend(type(caches[alias]))
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        with measure(metrics):
+            response = self.get_response(request)
+
+        # Потоковое тело генерируется уже после выхода из middleware: считаем
+        # его запросы и пишем метрики, когда поток закончится. Заголовок
+        # Server-Timing к этому моменту уже отправлен, поэтому его не ставим.
+        # FileResponse не трогаем, чтобы не потерять wsgi.file_wrapper.
+        if (response.streaming and not getattr(response, 'is_async', False)
+                and getattr(response, 'file_to_stream', None) is None):
+            response.streaming_content = self._iterate_measured(request, metrics, response.streaming_content)
+            return response
+
+        duration = self.record(request, metrics)
+        if self.server_timing and not response.streaming and self.show_server_timing(request):
+            response['Server-Timing'] = server_timing(metrics, duration, self.template_top)
+        return response
+
+    def show_server_timing(self, request):
+        """
+        Число запросов и имена шаблонов видят только сотрудники (или DEBUG).
+        Ответы сотрудникам идут с сессией и в кеш nginx не попадают.
+        """
+        if settings.DEBUG:
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+    def record(self, request, metrics):
+        duration = metrics.total_time
+        match = getattr(request, 'resolver_match', None)
+        registry.record(match.view_name if match else '<unresolved>', metrics, duration)
+        return duration
+
+    def _iterate_measured(self, request, metrics, iterable):
+        iterator = iter(iterable)
+        try:
+            while True:
+                with measure(metrics):
+                    try:
+                        chunk = next(iterator)
+                    except StopIteration:
+                        return
+                yield chunk
+        finally:
+            self.record(request, metrics)
+
+
+@staff_member_required
+def metrics_view(request):
+    """ Гистограммы по представлениям (только для сотрудников) """
+    return JsonResponse(registry.snapshot(), json_dumps_params={'ensure_ascii': False})
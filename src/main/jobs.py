@@ -0,0 +1,341 @@
+"""
+Очередь фоновых задач на самой PostgreSQL, без внешнего брокера.
+
+Задача — функция, помеченная @job (обычно в main.tasks). Постановка в
+очередь — строка в таблице Job внутри текущей транзакции, поэтому задача
+появляется у воркера только после коммита. Воркер (manage.py run_worker)
+забирает задачи через SELECT ... FOR UPDATE SKIP LOCKED: несколько
+процессов не получат одну и ту же задачу и не ждут друг друга.
+Ошибка — повтор с экспоненциальной задержкой до max_attempts,
+время выполнения каждой задачи сохраняется в Job.duration (см. job_stats).
+Выполненные задачи старше JOB_KEEP_DONE_DAYS воркер удаляет раз в час.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import traceback
+from datetime import timedelta
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, IntegrityError, close_old_connections, connections, transaction
+from django.db.models import Avg, Count, F, Max, Sum
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_DELAY = getattr(settings, 'JOB_RETRY_BASE_DELAY', 30)
+DEFAULT_TIMEOUT = getattr(settings, 'JOB_TIMEOUT', 30 * 60)
+# Задача в статусе running дольше этого считается брошенной (воркер убит) и возвращается
+# в очередь. Должно быть больше таймаута любой задачи, иначе её запустят второй раз
+STALE_AFTER = getattr(settings, 'JOB_STALE_AFTER', 3 * 60 * 60)
+# Выполненные задачи хранятся столько дней, затем воркер их удаляет (ошибки остаются)
+KEEP_DONE_DAYS = getattr(settings, 'JOB_KEEP_DONE_DAYS', 7)
+PRUNE_INTERVAL = 60 * 60
+PRUNE_BATCH_SIZE = 10000
+
+_registry = {}
+
+
+class JobTimeout(BaseException):
+    """ BaseException: except Exception внутри задачи не должен проглотить таймаут """
+
+
+def job(func=None, *, name=None, max_attempts=3, timeout=None, unique=False):
+    """
+    Регистрирует функцию как фоновую задачу и добавляет ей .enqueue().
+    unique=True — не ставить задачу, если такая же (с теми же аргументами)
+    уже ждёт в очереди или выполняется: для пересборок, которые не должны
+    идти параллельно и которые достаточно выполнить один раз.
+    """
+    def decorator(func):
+        job_name = name or f'{func.__module__}.{func.__name__}'
+        func.job_name = job_name
+        func.max_attempts = max_attempts
+        func.timeout = timeout or DEFAULT_TIMEOUT
+        func.unique = unique
+        func.enqueue = lambda *args, **kwargs: enqueue(func, *args, **kwargs)
+        _registry[job_name] = func
+        return func
+
+    return decorator(func) if func is not None else decorator
+
+
+def unique_key(name, args, kwargs):
+    payload = json.dumps([name, args, kwargs], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def enqueue(func, *args, run_at=None, **kwargs):
+    """ Ставит задачу в очередь. Возвращает Job (или активную копию для unique). """
+    args = list(args)
+    key = unique_key(func.job_name, args, kwargs) if func.unique else None
+    for attempt in range(3):
+        if key is not None:
+            existing = Job.objects.filter(unique_key=key, status__in=Job.ACTIVE_STATUSES).first()
+            if existing is not None:
+                return existing
+        try:
+            # Проверка выше не атомарна: гонку двух постановок решает
+            # уникальный индекс main_job_unique_active
+            with transaction.atomic():
+                return Job.objects.create(
+                    name=func.job_name,
+                    args=args,
+                    kwargs=kwargs,
+                    max_attempts=func.max_attempts,
+                    run_at=run_at or timezone.now(),
+                    unique_key=key,
+                )
+        except IntegrityError:
+            # Копию поставили параллельно; если она уже успела завершиться — ставим заново
+            if key is None or attempt == 2:
+                raise
+
+
+def autodiscover():
+    """ Импортирует <app>.tasks всех приложений, чтобы заполнить реестр задач """
+    for app_config in apps.get_app_configs():
+        try:
+            import_module(f'{app_config.name}.tasks')
+        except ModuleNotFoundError as error:
+            if error.name != f'{app_config.name}.tasks':
+                raise
+
+
+def claim(worker):
+    """ Забирает одну готовую к запуску задачу или возвращает None """
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_at__lte=timezone.now())
+            .order_by('run_at', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.started_at = timezone.now()
+        job.finished_at = None
+        job.worker = worker
+        job.save(update_fields=['status', 'attempts', 'started_at', 'finished_at', 'worker'])
+    return job
+
+
+def check_stale_after(stale_after=STALE_AFTER):
+    """ JOB_STALE_AFTER должен быть больше таймаута любой зарегистрированной задачи """
+    longest = max(_registry.values(), key=lambda func: func.timeout, default=None)
+    if longest is not None and stale_after <= longest.timeout:
+        raise ImproperlyConfigured(
+            f"JOB_STALE_AFTER ({stale_after} с) должен быть больше таймаута задачи "
+            f"{longest.job_name} ({longest.timeout} с)"
+        )
+
+
+def requeue_stale(stale_after=STALE_AFTER):
+    """
+    Задачи, чей воркер умер посреди выполнения: возвращает в очередь или,
+    если попытки кончились, помечает ошибкой. Возвращает (в очереди, с ошибкой).
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=now - timedelta(seconds=stale_after))
+    error = f"Воркер не завершил задачу за {stale_after} с"
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, error=error,
+    )
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status=Job.QUEUED, run_at=now, error=error,
+    )
+    if requeued or failed:
+        logger.warning("Брошенные задачи: возвращено в очередь %s, с ошибкой %s", requeued, failed)
+    return requeued, failed
+
+
+def prune_jobs(days=KEEP_DONE_DAYS):
+    """ Удаляет выполненные задачи старше days дней пачками. Возвращает число удалённых. """
+    deadline = timezone.now() - timedelta(days=days)
+    queryset = Job.objects.filter(status=Job.DONE, finished_at__lt=deadline)
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:PRUNE_BATCH_SIZE])
+        if not ids:
+            return deleted
+        deleted += Job.objects.filter(id__in=ids).delete()[0]
+
+
+def _raise_timeout(signum, frame):
+    raise JobTimeout
+
+
+def _json_result(value):
+    try:
+        json.dumps(value)
+        return value
+    except (TypeError, ValueError):
+        return repr(value)
+
+
+def execute(job):
+    """ Выполняет задачу и записывает результат, ошибку или повтор """
+    func = _registry.get(job.name)
+    started = time.monotonic()
+    result = error = None
+    try:
+        if func is None:
+            raise LookupError(f"Неизвестная задача {job.name}")
+        # Таймаут через SIGALRM: воркер выполняет задачи в главном потоке своего процесса
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, func.timeout)
+        try:
+            result = func(*job.args, **job.kwargs)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    except JobTimeout:
+        error = f"Превышено время выполнения ({func.timeout} с)"
+    except Exception:
+        error = traceback.format_exc()
+
+    job.duration = time.monotonic() - started
+    job.finished_at = timezone.now()
+    if error is None:
+        job.status = Job.DONE
+        job.result = _json_result(result)
+        job.error = ''
+        logger.info("Задача %s выполнена за %.2f с", job, job.duration)
+    elif job.attempts < job.max_attempts and func is not None:
+        job.status = Job.QUEUED
+        job.run_at = timezone.now() + timedelta(seconds=RETRY_BASE_DELAY * 2 ** (job.attempts - 1))
+        job.error = error
+        logger.warning("Задача %s упала (попытка %s из %s), повтор в %s", job, job.attempts, job.max_attempts, job.run_at)
+    else:
+        job.status = Job.FAILED
+        job.error = error
+        logger.error("Задача %s завершилась с ошибкой:\n%s", job, error)
+    save_result(job)
+    return job
+
+
+def save_result(job):
+    job.save(update_fields=['status', 'duration', 'finished_at', 'result', 'error', 'run_at'])
+
+
+def work(poll_interval=1.0, burst=False, stop=None):
+    """
+    Цикл одного процесса воркера. burst=True — выйти, когда очередь опустела.
+    stop — функция, которая возвращает True, когда пора завершаться.
+    """
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    processed = 0
+    last_stale_check = last_prune = 0.0
+    # Выполненная задача, результат которой не удалось записать
+    unsaved = None
+    while not (stop and stop()):
+        close_old_connections()
+        try:
+            if unsaved is not None:
+                save_result(unsaved)
+                unsaved = None
+            if time.monotonic() - last_stale_check > 60:
+                requeue_stale()
+                last_stale_check = time.monotonic()
+            if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                prune_jobs()
+                last_prune = time.monotonic()
+            job = claim(worker)
+        except DatabaseError:
+            # База недоступна или занята: не роняем воркер, пробуем позже
+            logger.warning("Не удалось обратиться к очереди задач", exc_info=True)
+            time.sleep(poll_interval)
+            continue
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+        try:
+            execute(job)
+        except DatabaseError:
+            # Задача выполнена, но база недоступна: запишем результат на следующем круге,
+            # а не оставим задачу в статусе running до requeue_stale
+            logger.warning("Не удалось записать результат задачи %s", job, exc_info=True)
+            unsaved = job
+            time.sleep(poll_interval)
+        except Exception:
+            logger.exception("Ошибка воркера при выполнении задачи %s", job)
+        processed += 1
+
+    if unsaved is not None:
+        try:
+            save_result(unsaved)
+        except DatabaseError:
+            logger.error("Результат задачи %s потерян, её вернёт в очередь requeue_stale", unsaved, exc_info=True)
+    return processed
+
+
+def _worker_process(poll_interval, burst):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))
+    autodiscover()
+    work(poll_interval, burst, stop=lambda: bool(stopping))
+
+
+def run_worker(concurrency=1, poll_interval=1.0, burst=False):
+    """ Запускает concurrency процессов воркера и ждёт их завершения """
+    autodiscover()
+    check_stale_after()
+    if concurrency <= 1:
+        _worker_process(poll_interval, burst)
+        return
+
+    # Подключения к базе не должны переходить в дочерние процессы
+    connections.close_all()
+    processes = [
+        multiprocessing.Process(target=_worker_process, args=(poll_interval, burst), daemon=False)
+        for _ in range(concurrency)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+
+def job_stats(since=None):
+    """ Сводка по задачам: количество по статусам и время выполнения """
+    queryset = Job.objects.all()
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+
+    stats = {}
+    rows = queryset.values('name', 'status').annotate(
+        count=Count('id'), duration_avg=Avg('duration'), duration_max=Max('duration'), duration_sum=Sum('duration'),
+    ).order_by('name', 'status')
+    for row in rows:
+        entry = stats.setdefault(row['name'], {
+            'statuses': {}, 'duration_avg': None, 'duration_max': None, 'duration_sum': 0.0,
+        })
+        entry['statuses'][row['status']] = row['count']
+        if row['status'] == Job.DONE:
+            entry['duration_avg'] = row['duration_avg']
+            entry['duration_max'] = row['duration_max']
+            entry['duration_sum'] = row['duration_sum'] or 0.0
+    return stats
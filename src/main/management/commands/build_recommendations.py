@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.recommendations import CANDIDATE_WINDOW, CATEGORY_TOP_K, TOP_K, build_recommendations
+
+
+class Command(BaseCommand):
+    help = "Пересчёт похожих товаров и похожих категорий для всего каталога."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K, help="Похожих товаров на товар")
+        parser.add_argument('--category-top-k', type=int, default=CATEGORY_TOP_K, help="Похожих категорий на категорию")
+        parser.add_argument('--window', type=int, default=CANDIDATE_WINDOW,
+                            help="Сколько соседей по толщине рассматривать с каждой стороны")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        products, categories = build_recommendations(
+            top_k=options['top_k'],
+            category_top_k=options['category_top_k'],
+            window=options['window'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Пересчитано: {products} товаров, {categories} категорий за {time.monotonic() - started:.1f} с"
+        ))
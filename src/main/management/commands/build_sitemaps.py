@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from main.sitemaps import build_sitemaps
+
+
+class Command(BaseCommand):
+    help = "Сборка sitemap.xml и файлов sitemap-*.xml.gz. Пересобираются только изменившиеся файлы."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Перезаписать все файлы")
+
+    def handle(self, *args, force, **options):
+        result = build_sitemaps(force=force)
+        changed = [name for name, is_changed in result.items() if is_changed]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Файлов в карте сайта: {len(result)}, обновлено: {len(changed)}"
+        ))
+        for name in changed:
+            self.stdout.write(f"  {name}")
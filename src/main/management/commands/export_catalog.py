@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.exports import EXPORT_FORMATS, export_path, write_export
+
+
+class Command(BaseCommand):
+    help = "Выгрузка каталога в файл (csv, excel, yml). Файл не пересобирается, если каталог не менялся."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', default='csv', choices=sorted(EXPORT_FORMATS))
+        parser.add_argument('--output', help="Путь к итоговому файлу (по умолчанию — в EXPORT_ROOT, откуда его отдаёт сайт)")
+        parser.add_argument('--force', action='store_true', help="Пересобрать даже при совпадающем ETag")
+
+    def handle(self, *args, export_format, output, force, **options):
+        output = output or export_path(export_format)
+        try:
+            rebuilt = write_export(export_format, output, force=force)
+        except OSError as error:
+            raise CommandError(f"Не удалось записать {output}: {error}")
+
+        if rebuilt:
+            self.stdout.write(self.style.SUCCESS(f"Выгрузка сохранена в {output}"))
+        else:
+            self.stdout.write(f"Каталог не менялся, {output} актуален")
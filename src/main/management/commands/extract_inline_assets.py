@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from main.templating import MIN_ASSET_SIZE, extract_inline_assets
+
+
+class Command(BaseCommand):
+    help = "Выносит крупные inline <style>/<script> из шаблонов в статические файлы."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-size', type=int, default=MIN_ASSET_SIZE,
+                            help="Минимальный размер блока в символах")
+        parser.add_argument('--dry-run', action='store_true', help="Только показать, что будет вынесено")
+
+    def handle(self, *args, min_size, dry_run, **options):
+        result = extract_inline_assets(min_size=min_size, dry_run=dry_run)
+
+        for template_name, assets in result.items():
+            self.stdout.write(template_name)
+            for path in assets:
+                self.stdout.write(f"  {path}")
+        total = sum(len(assets) for assets in result.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Будет вынесено' if dry_run else 'Вынесено'} блоков: {total} из {len(result)} шаблонов"
+        ))
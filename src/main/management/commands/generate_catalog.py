@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from main.benchmarks import generate_catalog, purge_catalog
+
+
+class Command(BaseCommand):
+    help = "Генерация синтетического каталога для нагрузочных замеров (например, 500k товаров)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=1000, help="Сколько категорий создать")
+        parser.add_argument('--depth', type=int, default=3, help="Глубина дерева категорий")
+        parser.add_argument('--products', type=int, default=100000, help="Сколько товаров создать")
+        parser.add_argument('--seed', type=int, default=0, help="Seed генератора, каталог воспроизводим")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--purge', action='store_true', help="Удалить ранее сгенерированный каталог и выйти")
+
+    def handle(self, *args, **options):
+        if options['purge']:
+            deleted, _ = purge_catalog()
+            self.stdout.write(self.style.SUCCESS(f"Удалено записей: {deleted}"))
+            return
+
+        categories, products = generate_catalog(
+            categories=options['categories'],
+            products=options['products'],
+            depth=options['depth'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Готово: {categories} категорий, {products} товаров"))
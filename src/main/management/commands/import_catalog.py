@@ -0,0 +1,28 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import tasks
+
+
+class Command(BaseCommand):
+    help = "Импорт каталога из JSON-выгрузки. По умолчанию ставит задачу в очередь (manage.py run_worker)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='response.txt', help="Файл выгрузки")
+        parser.add_argument('--now', action='store_true', help="Выполнить сразу, без очереди")
+
+    def handle(self, *args, path, now, **options):
+        # Воркер запускается из другого каталога, поэтому путь абсолютный
+        path = os.path.abspath(path)
+        if not os.path.exists(path):
+            raise CommandError(f"Файл {path} не найден")
+
+        if now:
+            result = tasks.import_catalog(path)
+            self.stdout.write(self.style.SUCCESS(
+                f"Импорт данных завершён: категорий {result['categories']}, товаров {result['products']}"
+            ))
+        else:
+            job = tasks.import_catalog.enqueue(path)
+            self.stdout.write(self.style.SUCCESS(f"Импорт поставлен в очередь: {job}"))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.jobs import job_stats
+
+
+class Command(BaseCommand):
+    help = "Статистика фоновых задач: статусы и время выполнения."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help="За сколько последних часов (0 — за всё время)")
+
+    def handle(self, *args, hours, **options):
+        since = timezone.now() - timedelta(hours=hours) if hours else None
+        stats = job_stats(since)
+        if not stats:
+            self.stdout.write("Задач нет")
+            return
+
+        for name, entry in stats.items():
+            statuses = ', '.join(f"{status}={count}" for status, count in entry['statuses'].items())
+            line = f"{name}: {statuses}"
+            if entry['duration_avg'] is not None:
+                line += f"; среднее {entry['duration_avg']:.2f} с, максимум {entry['duration_max']:.2f} с"
+            self.stdout.write(line)
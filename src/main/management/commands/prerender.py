@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.prerender import prerender
+
+
+class Command(BaseCommand):
+    help = "Рендер информационных страниц и страниц услуг в статические файлы для nginx."
+
+    def handle(self, *args, **options):
+        rendered, skipped = prerender()
+        self.stdout.write(self.style.SUCCESS(f"Отрендерено страниц: {rendered}, пропущено: {skipped}"))
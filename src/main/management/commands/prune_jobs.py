@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.jobs import KEEP_DONE_DAYS, prune_jobs
+
+
+class Command(BaseCommand):
+    help = "Удаляет выполненные фоновые задачи старше заданного числа дней (задачи с ошибкой остаются)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=KEEP_DONE_DAYS, help="Сколько дней хранить выполненные задачи")
+
+    def handle(self, *args, days, **options):
+        deleted = prune_jobs(days)
+        self.stdout.write(self.style.SUCCESS(f"Удалено задач: {deleted}"))
@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.benchmarks import SCENARIOS, compare_with_baseline, run_scenarios
+from main.models import Product
+
+
+class Command(BaseCommand):
+    help = "Замер страниц каталога: throughput, перцентили задержки и число SQL-запросов по сценариям."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                            help="Сценарий (можно несколько раз), по умолчанию все")
+        parser.add_argument('--requests', type=int, default=200, help="Запросов на сценарий")
+        parser.add_argument('--concurrency', type=int, default=1, help="Параллельных клиентов")
+        parser.add_argument('--warmup', type=int, default=10, help="Прогревочных запросов (не учитываются)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear-cache', action='store_true', help="Очищать кеш перед каждым сценарием")
+        parser.add_argument('--output', help="Сохранить результаты в JSON (например, как базовую линию)")
+        parser.add_argument('--baseline', help="JSON с базовой линией для сравнения")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Допустимый рост задержки относительно базовой линии (0.2 = 20%%)")
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help="Завершиться с ошибкой, если есть регрессии")
+
+    def handle(self, *args, **options):
+        if not Product.objects.exists():
+            raise CommandError("Каталог пуст, сначала запустите manage.py generate_catalog")
+
+        results = run_scenarios(
+            names=options['scenario'] or list(SCENARIOS),
+            requests=options['requests'],
+            concurrency=options['concurrency'],
+            warmup=options['warmup'],
+            seed=options['seed'],
+            clear_cache=options['clear_cache'],
+        )
+
+        for name, stats in results['scenarios'].items():
+            self.stdout.write(
+                f"{name:<24} {stats['throughput_rps']:>8} rps  "
+                f"p50 {stats['latency_ms_p50']:>8} ms  p90 {stats['latency_ms_p90']:>8} ms  "
+                f"p99 {stats['latency_ms_p99']:>8} ms  queries {stats['queries_mean']} (max {stats['queries_max']})"
+                + (f"  errors {stats['errors']}" if stats['errors'] else '')
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            report, regressions = compare_with_baseline(results, baseline, options['threshold'])
+            self.stdout.write('\n'.join(report))
+            if regressions:
+                self.stdout.write(self.style.WARNING("Регрессии:\n" + '\n'.join(regressions)))
+                if options['fail_on_regression']:
+                    raise CommandError(f"Найдено регрессий: {len(regressions)}")
+            else:
+                self.stdout.write(self.style.SUCCESS("Регрессий нет"))
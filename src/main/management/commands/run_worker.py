@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Воркер фоновых задач (очередь в таблице main_job)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'JOB_WORKER_CONCURRENCY', 1),
+                            help="Сколько процессов запустить")
+        parser.add_argument('--poll-interval', type=float, default=getattr(settings, 'JOB_POLL_INTERVAL', 1.0),
+                            help="Пауза между опросами пустой очереди, с")
+        parser.add_argument('--burst', action='store_true', help="Выйти, когда очередь опустеет")
+
+    def handle(self, *args, concurrency, poll_interval, burst, **options):
+        self.stdout.write(f"Воркер запущен: процессов {concurrency}")
+        run_worker(concurrency=concurrency, poll_interval=poll_interval, burst=burst)
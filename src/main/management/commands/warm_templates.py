@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.templating import warm_up_templates
+
+
+class Command(BaseCommand):
+    help = "Компилирует все шаблоны (проверка, что ни один не сломан)."
+
+    def handle(self, *args, **options):
+        compiled, failed = warm_up_templates()
+        if failed:
+            raise CommandError(f"Шаблонов с ошибками: {failed} (скомпилировано {compiled})")
+        self.stdout.write(self.style.SUCCESS(f"Скомпилировано шаблонов: {compiled}"))
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_service_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryRecommendation',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation', serialize=False, to='main.category', verbose_name='Категория')),
+                ('category_ids', models.JSONField(default=list, verbose_name='Похожие категории (id по убыванию сходства)')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата расчёта')),
+            ],
+            options={
+                'verbose_name': 'Похожие категории',
+                'verbose_name_plural': 'Похожие категории',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation', serialize=False, to='main.product', verbose_name='Товар')),
+                ('product_ids', models.JSONField(default=list, verbose_name='Похожие товары (id по убыванию сходства)')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата расчёта')),
+            ],
+            options={
+                'verbose_name': 'Похожие товары',
+                'verbose_name_plural': 'Похожие товары',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EdgeCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=255, verbose_name='Тег')),
+                ('host', models.CharField(max_length=255, verbose_name='Хост')),
+                ('path', models.CharField(max_length=1000, verbose_name='Адрес')),
+                ('ajax', models.BooleanField(default=False, verbose_name='AJAX-версия')),
+                ('expires_at', models.DateTimeField(verbose_name='Истекает')),
+            ],
+            options={
+                'verbose_name': 'Страница в кеше nginx',
+                'verbose_name_plural': 'Страницы в кеше nginx',
+                'indexes': [models.Index(fields=['expires_at'], name='main_edgecache_expires_at')],
+                'constraints': [models.UniqueConstraint(fields=('tag', 'host', 'path', 'ajax'), name='main_edgecacheentry_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_edge_cache_entries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'id'], name='main_product_name_id'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_product_name_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='unique_key',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='Ключ уникальности'),
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('unique_key',), name='main_job_unique_active'),
+        ),
+    ]
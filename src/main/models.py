@@ -1,5 +1,8 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from django.urls import reverse
+from django.utils import timezone
 from slugify import slugify
 
 
@@ -16,11 +19,16 @@ class Category(models.Model):
         related_name='children',
         verbose_name="Родительская категория"
     )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
 
     class Meta:
         verbose_name = "Категория"
         verbose_name_plural = "Категории"
         ordering = ['name']
+        indexes = [
+            # Триграммный индекс под icontains (UPPER(name) LIKE ...) в админке и поиске
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='main_category_name_trgm'),
+        ]
 
     def __str__(self):
         return self.name
@@ -50,6 +58,7 @@ class Product(models.Model):
     )
     slug = models.SlugField(unique=True, verbose_name="Слаг", blank=True, null=True, max_length=255)
     description = models.TextField(blank=True, verbose_name="Описание")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
 
     class Meta:
         verbose_name = "Продукт"
@@ -57,6 +66,9 @@ class Product(models.Model):
         
         indexes = [
             models.Index(fields=['category']),
+            # Сортировка в админке: ORDER BY name, id ... LIMIT без сортировки всей таблицы
+            models.Index(fields=['name', 'id'], name='main_product_name_id'),
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='main_product_name_trgm'),
         ]
 
     def __str__(self):
@@ -64,15 +76,10 @@ class Product(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            counter = 1
-
-            while Product.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
+            from .utils import unique_slugs  # utils импортирует модели
 
-            self.slug = slug
+            # Свободный слаг подбирается пачкой кандидатов, а не exists() на каждый суффикс
+            self.slug = unique_slugs(Product, {self.pk: slugify(self.name)})[self.pk]
 
         super().save(*args, **kwargs)
 
@@ -87,18 +94,13 @@ class Service(models.Model):
     image = models.ImageField(max_length=255, blank=False, null=False, verbose_name="Картинка услуг")
     slug = models.SlugField(unique=True, verbose_name="Слаг", max_length=255, blank=True, null=True)
     description = models.TextField(blank=True, verbose_name="Описание")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            counter = 1
+            from .utils import unique_slugs
 
-            while Service.objects.filter(slug=slug).exists():  # Исправлено с Product на Service
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-
-            self.slug = slug
+            self.slug = unique_slugs(Service, {self.pk: slugify(self.name)})[self.pk]
 
         super().save(*args, **kwargs)
 
@@ -110,4 +112,119 @@ class Service(models.Model):
         verbose_name_plural = "Услуги"
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class ProductRecommendation(models.Model):
+    """ Заранее посчитанные похожие товары (manage.py build_recommendations) """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recommendation',
+        verbose_name="Товар"
+    )
+    product_ids = models.JSONField(default=list, verbose_name="Похожие товары (id по убыванию сходства)")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата расчёта")
+
+    class Meta:
+        verbose_name = "Похожие товары"
+        verbose_name_plural = "Похожие товары"
+
+    def __str__(self):
+        return f"Похожие для товара {self.product_id}"
+
+
+class CategoryRecommendation(models.Model):
+    """ Заранее посчитанные похожие категории (manage.py build_recommendations) """
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recommendation',
+        verbose_name="Категория"
+    )
+    category_ids = models.JSONField(default=list, verbose_name="Похожие категории (id по убыванию сходства)")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата расчёта")
+
+    class Meta:
+        verbose_name = "Похожие категории"
+        verbose_name_plural = "Похожие категории"
+
+    def __str__(self):
+        return f"Похожие для категории {self.category_id}"
+
+
+class Job(models.Model):
+    """ Фоновая задача (main.jobs), выполняется процессом manage.py run_worker """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (DONE, "Выполнена"),
+        (FAILED, "Ошибка"),
+    ]
+
+    name = models.CharField(max_length=255, verbose_name="Задача")
+    args = models.JSONField(default=list, blank=True, verbose_name="Аргументы")
+    kwargs = models.JSONField(default=dict, blank=True, verbose_name="Именованные аргументы")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED, verbose_name="Статус")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveIntegerField(default=3, verbose_name="Максимум попыток")
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Запустить не раньше")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начата")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершена")
+    duration = models.FloatField(null=True, blank=True, verbose_name="Длительность, с")
+    worker = models.CharField(max_length=255, blank=True, verbose_name="Воркер")
+    result = models.JSONField(null=True, blank=True, verbose_name="Результат")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    # Для задач с unique=True: хеш имени и аргументов, у остальных NULL
+    unique_key = models.CharField(max_length=64, null=True, blank=True, verbose_name="Ключ уникальности")
+
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ['-id']
+        indexes = [
+            # Выборка следующей задачи воркером: status = queued AND run_at <= now()
+            models.Index(fields=['status', 'run_at'], name='main_job_status_run_at'),
+        ]
+        constraints = [
+            # Не больше одной ждущей или выполняющейся копии unique-задачи
+            models.UniqueConstraint(
+                fields=['unique_key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='main_job_unique_active',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk}"
+
+
+class EdgeCacheEntry(models.Model):
+    """ Адрес страницы в кеше nginx под одним из её тегов (main.edge_cache) """
+    tag = models.CharField(max_length=255, verbose_name="Тег")
+    host = models.CharField(max_length=255, verbose_name="Хост")
+    path = models.CharField(max_length=1000, verbose_name="Адрес")
+    ajax = models.BooleanField(default=False, verbose_name="AJAX-версия")
+    expires_at = models.DateTimeField(verbose_name="Истекает")
+
+    class Meta:
+        verbose_name = "Страница в кеше nginx"
+        verbose_name_plural = "Страницы в кеше nginx"
+        constraints = [
+            # Регистрация — INSERT ... ON CONFLICT: параллельные промахи не теряют адреса
+            models.UniqueConstraint(fields=['tag', 'host', 'path', 'ajax'], name='main_edgecacheentry_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='main_edgecache_expires_at'),
+        ]
+
+    def __str__(self):
+        return f"{self.tag}: {self.host}{self.path}"
@@ -0,0 +1,38 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для больших таблиц в админке.
+
+    Для нефильтрованного списка на PostgreSQL берёт оценку количества строк
+    из статистики (pg_class.reltuples) вместо SELECT COUNT(*) по всей таблице.
+    С фильтрами/поиском, а также на других базах считает честно.
+    """
+    # Ниже этого порога оценке не доверяем и считаем COUNT(*)
+    min_estimate = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where and not query.distinct:
+            estimate = self.estimate(queryset)
+            if estimate is not None and estimate >= self.min_estimate:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def estimate(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return row[0] if row and row[0] > 0 else None
@@ -0,0 +1,129 @@
+"""
+Предварительный рендер редко меняющихся страниц: о компании, доставка,
+оплата, возврат, контакты, список услуг и страницы услуг.
+
+Каждая страница сохраняется как полный HTML (index.html), а страницы
+AjaxableTemplateView — ещё и как ответ для AJAX-навигации (index.json),
+плюс .gz-копии для gzip_static.
+Сборка пишется в новый каталог build-*, затем симлинк current атомарно
+переключается на него, так что nginx никогда не видит недописанных файлов.
+nginx отдаёт файлы через try_files, а при их отсутствии идёт в Django.
+"""
+import fcntl
+import gzip
+import logging
+import os
+import shutil
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from .models import Service
+from .views import AjaxableTemplateView
+
+
+logger = logging.getLogger(__name__)
+
+PAGES = ('main:about', 'main:delivery', 'main:payment', 'main:refund', 'main:contacts', 'main:services')
+CURRENT_LINK = 'current'
+BUILD_PREFIX = 'build-'
+LOCK_NAME = '.lock'
+KEEP_BUILDS = 2  # Текущая и предыдущая: nginx может ещё дочитывать старые файлы
+
+HTML_VARIANT = ('index.html', {})
+JSON_VARIANT = ('index.json', {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'})
+
+
+def variants_for(path):
+    """
+    JSON для AJAX-навигации отдаёт только AjaxableTemplateView. Остальные
+    представления отвечают на XHR обычным HTML: index.json для них не пишем,
+    и nginx передаёт такие запросы в Django.
+    """
+    view_class = getattr(resolve(path).func, 'view_class', None)
+    if view_class is not None and issubclass(view_class, AjaxableTemplateView):
+        return (HTML_VARIANT, JSON_VARIANT)
+    return (HTML_VARIANT,)
+
+
+def iter_paths():
+    for view_name in PAGES:
+        yield reverse(view_name)
+    for slug in Service.objects.exclude(slug__isnull=True).exclude(slug='').values_list('slug', flat=True):
+        yield reverse('main:services_detail', kwargs={'slug': slug})
+
+
+def render_path(path, **headers):
+    """ Рендер страницы без middleware: эти представления не зависят от пользователя """
+    host = urlsplit(settings.SITE_URL).hostname or 'localhost'
+    request = RequestFactory().get(path, HTTP_HOST=host, **headers)
+    match = resolve(path)
+    request.resolver_match = match
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code != 200:
+        raise ValueError(f"{path}: статус {response.status_code}")
+    return response.content
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(content)
+    # mtime=0 — одинаковый .gz для одинакового содержимого
+    with gzip.GzipFile(path + '.gz', 'wb', compresslevel=9, mtime=0) as file:
+        file.write(content)
+
+
+def switch_current(root, build_name):
+    """ Атомарная подмена симлинка current: новый симлинк + rename поверх старого """
+    tmp_link = os.path.join(root, f'.{CURRENT_LINK}-{os.getpid()}')
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(build_name, tmp_link)
+    os.replace(tmp_link, os.path.join(root, CURRENT_LINK))
+
+
+def remove_old_builds(root, keep=KEEP_BUILDS):
+    builds = sorted(name for name in os.listdir(root) if name.startswith(BUILD_PREFIX))
+    for name in builds[:-keep]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def prerender(root=None):
+    """
+    Собирает все страницы в новый каталог и переключает на него current.
+    Возвращает (отрендерено страниц, пропущено). Страницы, которые не
+    рендерятся (нет шаблона и т.п.), пропускаются — их отдаст Django.
+    """
+    root = root or settings.PRERENDER_ROOT
+    os.makedirs(root, exist_ok=True)
+
+    # Сборки из сигналов и из командной строки не должны пересекаться
+    with open(os.path.join(root, LOCK_NAME), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        build_name = f'{BUILD_PREFIX}{time.time_ns()}'
+        build_dir = os.path.join(root, build_name)
+        rendered = skipped = 0
+        for path in iter_paths():
+            try:
+                variants = [(file_name, render_path(path, **headers)) for file_name, headers in variants_for(path)]
+            except Exception as error:
+                logger.warning("Страница %s не отрендерена, её отдаст Django: %r", path, error)
+                skipped += 1
+                continue
+
+            page_dir = os.path.join(build_dir, path.strip('/'))
+            for file_name, content in variants:
+                write_file(os.path.join(page_dir, file_name), content)
+            rendered += 1
+
+        os.makedirs(build_dir, exist_ok=True)
+        switch_current(root, build_name)
+        remove_old_builds(root)
+    return rendered, skipped
@@ -0,0 +1,212 @@
+"""
+Расчёт «похожих товаров» и «похожих категорий».
+
+Весь каталог загружается в плоские массивы (array): категория, толщина и
+коды марки/ГОСТа/типа проката для каждого товара. Кандидаты для товара —
+ближайшие по толщине товары той же категории и соседних категорий (тот же
+родитель), поэтому расчёт идёт за O(N * окно), а не O(N²).
+Результат — списки id в ProductRecommendation / CategoryRecommendation,
+которые страница достаёт одним запросом по первичному ключу.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Category, CategoryRecommendation, Product, ProductRecommendation
+from .utils import GOST_RE, MARK_RE, THICKNESS_RE
+
+
+TOP_K = getattr(settings, 'RECOMMENDATIONS_TOP_K', 8)
+CATEGORY_TOP_K = getattr(settings, 'RECOMMENDATIONS_CATEGORY_TOP_K', 20)
+CANDIDATE_WINDOW = getattr(settings, 'RECOMMENDATIONS_WINDOW', 25)
+BATCH_SIZE = 2000
+
+# Веса признаков
+WEIGHT_SAME_CATEGORY = 4.0
+WEIGHT_SIBLING_CATEGORY = 2.0
+WEIGHT_MARK = 3.0
+WEIGHT_GOST = 2.0
+WEIGHT_TYPE = 1.0
+WEIGHT_THICKNESS = 2.0
+
+UNKNOWN = 0
+NO_THICKNESS = -1.0
+PRODUCT_TYPES = {'горячекатаная': 1, 'холоднокатаная': 2}
+
+
+class CatalogArrays:
+    """ Каталог в виде параллельных массивов: индекс в массиве = номер товара """
+
+    def __init__(self):
+        self.ids = array('q')
+        self.categories = array('q')
+        self.thickness = array('d')
+        self.marks = array('l')
+        self.gosts = array('l')
+        self.types = array('b')
+        self._codes = {}
+
+    def code(self, value):
+        """ Строка -> целочисленный код (0 — признак не найден) """
+        if not value:
+            return UNKNOWN
+        return self._codes.setdefault(value, len(self._codes) + 1)
+
+    def append(self, product_id, name, category_id):
+        thickness = THICKNESS_RE.search(name)
+        mark = MARK_RE.search(name)
+        gost = GOST_RE.search(name)
+        product_type = next((code for word, code in PRODUCT_TYPES.items() if word in name), UNKNOWN)
+
+        self.ids.append(product_id)
+        self.categories.append(category_id)
+        self.thickness.append(float(thickness.group(1)) if thickness else NO_THICKNESS)
+        self.marks.append(self.code(mark.group(1) if mark else None))
+        self.gosts.append(self.code(gost.group(1).replace(' ', '') if gost else None))
+        self.types.append(product_type)
+
+    @classmethod
+    def load(cls):
+        catalog = cls()
+        rows = Product.objects.order_by('id').values_list('id', 'name', 'category_id')
+        for product_id, name, category_id in rows.iterator(chunk_size=BATCH_SIZE):
+            catalog.append(product_id, name, category_id)
+        return catalog
+
+
+class SortedPool:
+    """ Номера товаров, отсортированные по толщине, и сами толщины для bisect """
+
+    def __init__(self, indexes, catalog):
+        indexes = sorted(indexes, key=lambda index: catalog.thickness[index])
+        self.indexes = array('l', indexes)
+        self.thickness = array('d', (catalog.thickness[index] for index in indexes))
+
+    def window(self, thickness, size):
+        position = bisect_left(self.thickness, thickness)
+        return self.indexes[max(0, position - size):position + size]
+
+
+def score(catalog, index, candidate, category_weight):
+    value = category_weight
+    mark = catalog.marks[index]
+    if mark and mark == catalog.marks[candidate]:
+        value += WEIGHT_MARK
+    gost = catalog.gosts[index]
+    if gost and gost == catalog.gosts[candidate]:
+        value += WEIGHT_GOST
+    product_type = catalog.types[index]
+    if product_type and product_type == catalog.types[candidate]:
+        value += WEIGHT_TYPE
+    thickness, other = catalog.thickness[index], catalog.thickness[candidate]
+    if thickness >= 0 and other >= 0:
+        value += WEIGHT_THICKNESS / (1.0 + abs(thickness - other))
+    return value
+
+
+def compute_product_neighbors(catalog, top_k=TOP_K, window=CANDIDATE_WINDOW):
+    """ Генератор (id товара, [id похожих товаров]) """
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+
+    by_category = defaultdict(list)
+    for index, category_id in enumerate(catalog.categories):
+        by_category[category_id].append(index)
+
+    by_parent = defaultdict(list)
+    for category_id, indexes in by_category.items():
+        parent_id = parents.get(category_id)
+        if parent_id is not None:
+            by_parent[parent_id].extend(indexes)
+
+    category_pools = {category_id: SortedPool(indexes, catalog) for category_id, indexes in by_category.items()}
+    sibling_pools = {parent_id: SortedPool(indexes, catalog) for parent_id, indexes in by_parent.items()}
+
+    for category_id, pool in category_pools.items():
+        sibling_pool = sibling_pools.get(parents.get(category_id))
+
+        for index in pool.indexes:
+            thickness = catalog.thickness[index]
+            scored = {}
+            for candidate in pool.window(thickness, window):
+                if candidate != index:
+                    scored[candidate] = score(catalog, index, candidate, WEIGHT_SAME_CATEGORY)
+            if sibling_pool is not None:
+                for candidate in sibling_pool.window(thickness, window):
+                    if candidate not in scored and catalog.categories[candidate] != category_id:
+                        scored[candidate] = score(catalog, index, candidate, WEIGHT_SIBLING_CATEGORY)
+
+            best = heapq.nlargest(top_k, scored.items(), key=lambda item: (item[1], -catalog.ids[item[0]]))
+            yield catalog.ids[index], [catalog.ids[candidate] for candidate, _ in best]
+
+
+def compute_category_neighbors(catalog, top_k=CATEGORY_TOP_K):
+    """
+    Генератор (id категории, [id похожих категорий]).
+    Кандидаты те же, что раньше считались на лету в ProductListView: соседи по
+    родителю, а если их нет — дети «дедушки». Порядок — по пересечению марок и
+    ГОСТов товаров (коэффициент Жаккара), затем по названию.
+    """
+    rows = list(Category.objects.values_list('id', 'parent_id', 'name'))
+    parents = {category_id: parent_id for category_id, parent_id, _ in rows}
+    names = {category_id: name for category_id, _, name in rows}
+    children = defaultdict(list)
+    for category_id, parent_id, _ in rows:
+        children[parent_id].append(category_id)
+
+    features = defaultdict(set)
+    for index, category_id in enumerate(catalog.categories):
+        if catalog.marks[index]:
+            features[category_id].add(('mark', catalog.marks[index]))
+        if catalog.gosts[index]:
+            features[category_id].add(('gost', catalog.gosts[index]))
+
+    def similarity(first, second):
+        union = features[first] | features[second]
+        return len(features[first] & features[second]) / len(union) if union else 0.0
+
+    for category_id, parent_id in parents.items():
+        candidates = [other for other in children[parent_id] if other != category_id]
+        if not candidates and parent_id is not None:
+            grandparent_id = parents.get(parent_id)
+            if grandparent_id is not None:
+                candidates = [other for other in children[grandparent_id] if other != category_id]
+
+        ranked = sorted(candidates, key=lambda other: (-similarity(category_id, other), names[other]))
+        yield category_id, ranked[:top_k]
+
+
+def build_recommendations(top_k=TOP_K, category_top_k=CATEGORY_TOP_K, window=CANDIDATE_WINDOW):
+    """ Полный пересчёт. Старые данные заменяются в одной транзакции. """
+    catalog = CatalogArrays.load()
+
+    with transaction.atomic():
+        ProductRecommendation.objects.all().delete()
+        batch = []
+        products = 0
+        for product_id, neighbor_ids in compute_product_neighbors(catalog, top_k, window):
+            batch.append(ProductRecommendation(product_id=product_id, product_ids=neighbor_ids))
+            if len(batch) >= BATCH_SIZE:
+                ProductRecommendation.objects.bulk_create(batch)
+                products += len(batch)
+                batch = []
+        ProductRecommendation.objects.bulk_create(batch)
+        products += len(batch)
+
+        CategoryRecommendation.objects.all().delete()
+        category_batch = [
+            CategoryRecommendation(category_id=category_id, category_ids=neighbor_ids)
+            for category_id, neighbor_ids in compute_category_neighbors(catalog, category_top_k)
+        ]
+        CategoryRecommendation.objects.bulk_create(category_batch, batch_size=BATCH_SIZE)
+
+    return products, len(category_batch)
+
+
+def ordered_by_ids(queryset, ids):
+    """ Объекты в порядке списка ids (удалённые после расчёта пропускаются) """
+    objects = queryset.in_bulk(ids)
+    return [objects[object_id] for object_id in ids if object_id in objects]
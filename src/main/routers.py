@@ -0,0 +1,180 @@
+"""
+Маршрутизация чтения каталога на реплики PostgreSQL.
+
+ReplicaRoutingMiddleware разрешает чтение с реплик только для безопасных
+(GET/HEAD) запросов к публичным страницам. Внутри такого запроса
+ReplicaRouter отправляет чтения моделей из DATABASE_REPLICA_APPS на
+здоровую реплику, а запись — всегда на основную базу. После первой записи
+все дальнейшие чтения этого запроса тоже идут на основную базу
+(read-after-write). Реплика с отставанием больше DATABASE_REPLICA_MAX_LAG
+секунд или с ошибкой подключения временно исключается.
+"""
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+
+logger = logging.getLogger(__name__)
+
+_routing_state = ContextVar('db_routing_state', default=None)
+
+# NULL — WAL receiver не запущен или не в состоянии streaming: реплика
+# отключилась от основной базы, и совпадение receive/replay LSN ничего
+# не говорит об отставании. status виден только ролям с pg_read_all_stats,
+# без неё проверяется лишь то, что WAL receiver запущен
+POSTGRES_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver WHERE COALESCE(status, 'streaming') = 'streaming'
+        ) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+class RoutingState:
+    """ Состояние маршрутизации в рамках одного HTTP-запроса """
+
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.pinned = False
+        self.replica = None
+
+
+class ReplicaHealth:
+    """ Кешированная на DATABASE_REPLICA_CHECK_INTERVAL секунд проверка отставания реплик """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = {}
+
+    def is_healthy(self, alias):
+        interval = getattr(settings, 'DATABASE_REPLICA_CHECK_INTERVAL', 5)
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(alias)
+            if checked and now - checked[0] < interval:
+                return checked[1]
+
+        healthy = self.check(alias)
+        with self._lock:
+            self._checked[alias] = (now, healthy)
+        return healthy
+
+    def check(self, alias):
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            # У SQLite (локальные тесты) отставания нет
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(POSTGRES_LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except DatabaseError:
+            logger.warning("Реплика %s недоступна, читаем с основной базы", alias, exc_info=True)
+            return False
+
+        if lag is None:
+            logger.warning("Реплика %s не получает WAL с основной базы, читаем с основной базы", alias)
+            return False
+        lag = float(lag)
+
+        max_lag = getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 5)
+        if lag > max_lag:
+            logger.warning("Реплика %s отстаёт на %.1f с (допустимо %s с)", alias, lag, max_lag)
+            return False
+        return True
+
+    def reset(self):
+        with self._lock:
+            self._checked.clear()
+
+
+health = ReplicaHealth()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        if state is None or not state.use_replicas or state.pinned:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label not in getattr(settings, 'DATABASE_REPLICA_APPS', ('main',)):
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        # Реплика выбирается один раз на запрос, чтобы не смешивать разные снимки данных
+        if state.replica is None:
+            healthy = [alias for alias in replica_aliases() if health.is_healthy(alias)]
+            state.replica = random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему через репликацию PostgreSQL
+        return db == DEFAULT_DB_ALIAS
+
+
+def _iterate_with_state(state, iterable):
+    """ Потоковые ответы читают базу уже после выхода из middleware """
+    iterator = iter(iterable)
+    while True:
+        token = _routing_state.set(state)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _routing_state.reset(token)
+        yield chunk
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Разрешает чтение с реплик для GET/HEAD запросов к публичным страницам.
+    Админка (DATABASE_REPLICA_EXCLUDE_PATHS) и запросы с записью работают
+    только с основной базой.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def use_replicas(self, request):
+        if not replica_aliases() or request.method not in ('GET', 'HEAD'):
+            return False
+        excluded = getattr(settings, 'DATABASE_REPLICA_EXCLUDE_PATHS', ('/admin/',))
+        return not request.path.startswith(tuple(excluded))
+
+    def __call__(self, request):
+        state = RoutingState(self.use_replicas(request))
+        token = _routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+
+        # FileResponse базу не читает, а обёртка лишила бы его wsgi.file_wrapper
+        if (state.use_replicas and getattr(response, 'streaming', False)
+                and getattr(response, 'file_to_stream', None) is None):
+            response.streaming_content = _iterate_with_state(state, response.streaming_content)
+        return response
@@ -0,0 +1,82 @@
+"""
+Сброс кеша страниц (main.edge_cache) при изменении каталога, пересборка
+статических страниц услуг (main.prerender) и миниатюр. Всё ставится
+в очередь фоновых задач (main.jobs) и выполняется после коммита.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import tasks
+from .models import Category, Product, Service
+
+
+_deferred = ContextVar('deferred_purge', default=None)
+
+
+@contextmanager
+def purge_deferred():
+    """
+    Копит теги внутри блока и ставит в конце одну задачу сброса. Для импорта,
+    массовых и каскадных удалений, где сигналы приходят на каждую строку.
+    """
+    tags, categories = set(), set()
+    token = _deferred.set((tags, categories))
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+    if tags or categories:
+        tasks.purge_edge_cache.enqueue(sorted(tags), sorted(categories))
+
+
+def purge(tags, category_ids=()):
+    """ Сбрасывает теги и теги категорий (предков категорий находит воркер) """
+    category_ids = {category_id for category_id in category_ids if category_id is not None}
+    deferred = _deferred.get()
+    if deferred is not None:
+        deferred[0].update(tags)
+        deferred[1].update(category_ids)
+        return
+    tasks.purge_edge_cache.enqueue(sorted(tags), sorted(category_ids))
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_state(sender, instance, raw=False, **kwargs):
+    # При переносе товара сбрасываем и старую категорию, при замене картинки — пересоздаём миниатюры
+    if instance.pk and not raw:
+        instance._old_category_id, instance._old_image = (
+            Product.objects.filter(pk=instance.pk).values_list('category_id', 'image').first() or (None, None)
+        )
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_category_id = getattr(instance, '_old_category_id', None)
+    purge({f'product-{instance.id}'}, [instance.category_id, old_category_id])
+
+    image_changed = instance.image and instance.image.name != getattr(instance, '_old_image', None)
+    if kwargs['signal'] is post_save and image_changed:
+        # Миниатюры создаёт воркер, запрос к админке их не ждёт
+        tasks.regenerate_thumbnails.enqueue([instance.id])
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Название категории выводится в меню и списках, поэтому сбрасываем весь каталог
+    purge({'catalog'}, [instance.id, instance.parent_id])
+
+
+@receiver([post_save, post_delete], sender=Service)
+def service_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    purge({'services', f'service-{instance.id}'})
+    # Страницы услуг отдаются nginx'ом из заранее отрендеренных файлов
+    tasks.rebuild_prerendered.enqueue()
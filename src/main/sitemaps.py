@@ -0,0 +1,194 @@
+"""
+Генерация sitemap.xml для всего каталога.
+
+Ссылки читаются потоково (values_list + iterator), режутся на файлы по
+SITEMAP_LIMIT адресов и сразу пишутся в .xml.gz, которые nginx отдаёт как
+статику. Рядом лежит manifest.json с хешем каждого файла: при повторной
+сборке файл подменяется только если его содержимое изменилось.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from itertools import chain, islice
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.urls import reverse
+
+from .models import Category, Product, Service
+from .utils import atomic_write, file_lock, replace_file, site_url, slug_url_builder, temp_file_near
+
+
+SITEMAP_LIMIT = 50000
+SITEMAP_CHUNK_SIZE = 5000
+MANIFEST_NAME = 'manifest.json'
+SHARD_RE = re.compile(r'^sitemap-[a-z]+-\d+\.xml\.gz$')
+
+URLSET_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+URLSET_FOOTER = '</urlset>\n'
+
+
+def iter_page_entries():
+    for view_name in ('main:index', 'main:category', 'main:services', 'main:about', 'main:contacts'):
+        yield site_url(reverse(view_name)), None
+
+
+def iter_category_entries():
+    # Категории без потомков редиректят на список товаров, поэтому в карту идёт он
+    parent_ids = set(Category.objects.filter(parent__isnull=False).values_list('parent_id', flat=True).distinct())
+    detail_url = slug_url_builder('main:category_detail')
+    list_url = slug_url_builder('main:product_list')
+
+    rows = Category.objects.order_by('id').values_list('id', 'slug', 'updated_at')
+    for cat_id, slug, updated_at in rows.iterator(chunk_size=SITEMAP_CHUNK_SIZE):
+        yield (detail_url(slug) if cat_id in parent_ids else list_url(slug)), updated_at
+
+
+def iter_service_entries():
+    detail_url = slug_url_builder('main:services_detail')
+    rows = Service.objects.exclude(slug__isnull=True).order_by('id').values_list('slug', 'updated_at')
+    for slug, updated_at in rows.iterator(chunk_size=SITEMAP_CHUNK_SIZE):
+        yield detail_url(slug), updated_at
+
+
+def iter_product_entries():
+    detail_url = slug_url_builder('main:product_detail')
+    rows = Product.objects.exclude(slug__isnull=True).order_by('id').values_list('slug', 'updated_at')
+    for slug, updated_at in rows.iterator(chunk_size=SITEMAP_CHUNK_SIZE):
+        yield detail_url(slug), updated_at
+
+
+SECTIONS = (
+    ('pages', iter_page_entries),
+    ('categories', iter_category_entries),
+    ('services', iter_service_entries),
+    ('products', iter_product_entries),
+)
+
+
+def url_entry(loc, lastmod):
+    if lastmod:
+        return f'<url><loc>{escape(loc)}</loc><lastmod>{lastmod:%Y-%m-%d}</lastmod></url>\n'
+    return f'<url><loc>{escape(loc)}</loc></url>\n'
+
+
+def write_gzip(path, parts):
+    """
+    Пишет части во временный .gz (mtime=0, чтобы одинаковое содержимое давало
+    одинаковый файл) и возвращает (путь к временному файлу, sha1 содержимого).
+    """
+    digest = hashlib.sha1()
+    fd, tmp_path = temp_file_near(path)
+    try:
+        # filename='' — иначе в заголовок gzip попадёт случайное имя временного файла
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(filename='', fileobj=raw, mode='wb', mtime=0) as file:
+            for part in parts:
+                data = part.encode('utf-8')
+                digest.update(data)
+                file.write(data)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest()
+
+
+def commit_file(tmp_path, path, digest, old_digest):
+    """ Подменяем файл атомарно, только если содержимое изменилось """
+    if digest == old_digest and os.path.exists(path):
+        os.remove(tmp_path)
+        return False
+    replace_file(tmp_path, path)
+    return True
+
+
+def write_shard(path, entries, old_digest):
+    lastmod = None
+
+    def parts():
+        nonlocal lastmod
+        yield URLSET_HEADER
+        for loc, updated_at in entries:
+            if updated_at and (lastmod is None or updated_at > lastmod):
+                lastmod = updated_at
+            yield url_entry(loc, updated_at)
+        yield URLSET_FOOTER
+
+    tmp_path, digest = write_gzip(path, parts())
+    changed = commit_file(tmp_path, path, digest, old_digest)
+    return digest, lastmod, changed
+
+
+def write_index(root, shards):
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+    for name, info in shards.items():
+        loc = escape(site_url(f"{settings.SITEMAP_URL}{name}"))
+        lastmod = f"<lastmod>{info['lastmod']}</lastmod>" if info['lastmod'] else ''
+        parts.append(f'<sitemap><loc>{loc}</loc>{lastmod}</sitemap>\n')
+    parts.append('</sitemapindex>\n')
+    content = ''.join(parts).encode('utf-8')
+
+    # Несжатый индекс для клиентов без gzip и .gz рядом для gzip_static
+    index_path = os.path.join(root, 'sitemap.xml')
+    with atomic_write(index_path, 'wb') as file:
+        file.write(content)
+    with atomic_write(f'{index_path}.gz', 'wb') as raw, gzip.GzipFile(filename='', fileobj=raw, mode='wb', mtime=0) as file:
+        file.write(content)
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_sitemaps(root=None, force=False):
+    """
+    Собирает (или обновляет) все файлы карты сайта.
+    Возвращает словарь {имя файла: изменился ли он}.
+    """
+    root = root or settings.SITEMAP_ROOT
+    os.makedirs(root, exist_ok=True)
+    # Задача и manage.py build_sitemaps не должны собирать карту одновременно
+    with file_lock(os.path.join(root, 'sitemap.xml')):
+        return write_sitemaps(root, force)
+
+
+def write_sitemaps(root, force):
+    # Старый манифест нужен и при force: по нему удаляются лишние файлы
+    old_manifest = load_manifest(root)
+    shards = {}
+    result = {}
+
+    for section, iter_entries in SECTIONS:
+        entries = iter_entries()
+        number = 1
+        while True:
+            # Смотрим на первую запись, чтобы не создавать пустой файл
+            first = next(entries, None)
+            if first is None:
+                break
+            shard_entries = chain([first], islice(entries, SITEMAP_LIMIT - 1))
+
+            name = f'sitemap-{section}-{number}.xml.gz'
+            old_digest = None if force else old_manifest.get(name, {}).get('digest')
+            digest, lastmod, changed = write_shard(os.path.join(root, name), shard_entries, old_digest)
+            shards[name] = {'digest': digest, 'lastmod': f'{lastmod:%Y-%m-%d}' if lastmod else None}
+            result[name] = changed
+            number += 1
+
+    # Удаляем файлы, которых больше нет (каталог уменьшился). Смотрим и в сам
+    # каталог: манифест мог потеряться или быть испорчен
+    existing = {name for name in os.listdir(root) if SHARD_RE.match(name)}
+    for name in (set(old_manifest) | existing) - set(shards):
+        path = os.path.join(root, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    write_index(root, shards)
+    with atomic_write(os.path.join(root, MANIFEST_NAME), encoding='utf-8') as file:
+        json.dump(shards, file, indent=2)
+    return result
@@ -0,0 +1,31 @@
+from django.contrib import admin
+from django.contrib.admin.views.autocomplete import AutocompleteJsonView
+
+from .models import Category
+from .utils import build_category_paths
+
+
+class TreeAutocompleteJsonView(AutocompleteJsonView):
+    """
+    Автодополнение, которое для категорий показывает полный путь
+    («Черный металлопрокат / Трубный прокат / ...»), а не только название:
+    в каталоге много одноимённых подкатегорий в разных ветках.
+    """
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        if self.model_admin.model is Category:
+            # Пути всех категорий одним запросом на ответ
+            self.category_paths = build_category_paths()
+        return super().get_context_data(object_list=object_list, **kwargs)
+
+    def serialize_result(self, obj, to_field_name):
+        result = super().serialize_result(obj, to_field_name)
+        paths = getattr(self, 'category_paths', None)
+        if paths is not None and isinstance(obj, Category):
+            result['text'] = paths.get(obj.pk, result['text'])
+        return result
+
+
+class CatalogAdminSite(admin.AdminSite):
+    def autocomplete_view(self, request):
+        return TreeAutocompleteJsonView.as_view(admin_site=self)(request)
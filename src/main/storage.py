@@ -0,0 +1,22 @@
+"""
+Хранилище статики: collectstatic добавляет к именам файлов хеш содержимого
+(css/templates/base-1.1a2b3c4d5e6f.css), {% static %} подставляет эти имена
+из staticfiles.json, а nginx отдаёт хешированные файлы с долгим сроком
+кеширования. После правки файла меняется хеш, а с ним и адрес.
+"""
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+class LenientManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Если файла нет в манифесте или в STATIC_ROOT (collectstatic ещё не
+    запускался: тесты, локальная разработка), отдаёт имя без хеша вместо ошибки.
+    Такие адреса nginx кеширует ненадолго.
+    """
+    manifest_strict = False
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            return name
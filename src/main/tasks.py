@@ -0,0 +1,132 @@
+"""
+Тяжёлые операции над каталогом, которые не должны выполняться
+в потоке веб-запроса: импорт, массовый перенос товаров, пересоздание
+слагов и миниатюр, пересборка рекомендаций, карты сайта, выгрузок
+и статических страниц, сброс кеша nginx. Все они — фоновые задачи
+(main.jobs), ставятся через .enqueue() и выполняются manage.py run_worker.
+Массовые операции работают пачками по BATCH_SIZE.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+from slugify import slugify
+
+from . import exports, importer
+from .edge_cache import category_tags, purge_cache_tags
+from .jobs import job
+from .models import Product
+from .prerender import prerender
+from .recommendations import build_recommendations
+from .sitemaps import build_sitemaps
+from .thumbnails import THUMBNAIL_SIZES, generate_thumbnail
+from .utils import unique_slugs
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def batched(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@job
+def move_products(product_ids, category_id):
+    """ Переносит товары в другую категорию """
+    moved = 0
+    old_categories = set()
+    for batch in batched(product_ids):
+        with transaction.atomic():
+            products = Product.objects.filter(id__in=batch)
+            old_categories.update(products.values_list('category_id', flat=True).distinct())
+            moved += products.update(category_id=category_id, updated_at=timezone.now())
+
+    # update() не шлёт сигналы, поэтому кеш страниц сбрасываем сами
+    purge_cache_tags([
+        *(f'product-{product_id}' for product_id in product_ids),
+        *category_tags(category_id, *old_categories),
+    ])
+    return moved
+
+
+@job
+def regenerate_slugs(product_ids):
+    """ Пересоздаёт слаги из названий товаров """
+    updated = 0
+    for batch in batched(product_ids):
+        with transaction.atomic():
+            products = list(Product.objects.filter(id__in=batch).only('id', 'name', 'slug'))
+            slugs = unique_slugs(Product, {
+                product.id: slugify(product.name) or f'product-{product.id}' for product in products
+            })
+            changed = []
+            now = timezone.now()
+            for product in products:
+                if product.slug != slugs[product.id]:
+                    product.slug = slugs[product.id]
+                    product.updated_at = now
+                    changed.append(product)
+            Product.objects.bulk_update(changed, ['slug', 'updated_at'])
+            updated += len(changed)
+            purge_cache_tags([f'product-{product.id}' for product in changed])
+    return updated
+
+
+@job
+def regenerate_thumbnails(product_ids, sizes=None):
+    """ Пересоздаёт миниатюры картинок товаров """
+    sizes = sizes or list(THUMBNAIL_SIZES)
+    generated = 0
+    for batch in batched(product_ids):
+        names = Product.objects.filter(id__in=batch).exclude(image='').values_list('image', flat=True)
+        for name in names:
+            for size in sizes:
+                try:
+                    generate_thumbnail(name, size)
+                    generated += 1
+                except (OSError, ValueError):
+                    logger.exception("Не удалось создать миниатюру %s (%s)", name, size)
+    return generated
+
+
+@job
+def purge_edge_cache(tags, category_ids=()):
+    """ Обновляет в nginx страницы с этими тегами и страницы категорий вместе с предками """
+    return purge_cache_tags({*tags, *category_tags(*category_ids)})
+
+
+@job(unique=True)
+def rebuild_prerendered():
+    return prerender()
+
+
+@job(unique=True, timeout=2 * 60 * 60)
+def rebuild_recommendations():
+    return build_recommendations()
+
+
+@job(unique=True)
+def rebuild_sitemaps():
+    changed = build_sitemaps()
+    return sum(changed.values())
+
+
+@job(unique=True)
+def rebuild_export(export_format):
+    """ Пересобирает файл выгрузки каталога, который отдаёт ProductExportView """
+    return exports.write_export(export_format)
+
+
+@job(max_attempts=1, timeout=2 * 60 * 60)
+def import_catalog(path):
+    """ Импорт каталога из JSON, затем пересборка зависящих от него данных """
+    result = importer.import_catalog(path)
+    rebuild_sitemaps.enqueue()
+    rebuild_recommendations.enqueue()
+    for export_format in exports.EXPORT_FORMATS:
+        rebuild_export.enqueue(export_format)
+    return result
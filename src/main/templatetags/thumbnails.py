@@ -0,0 +1,14 @@
+from django import template
+
+from main.thumbnails import THUMBNAIL_SIZES, thumbnail_url
+
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail(image, size='card'):
+    """ {{ product.image|thumbnail:"card" }} — миниатюра, если есть, иначе оригинал """
+    if not image or size not in THUMBNAIL_SIZES:
+        return image.url if image else ''
+    return thumbnail_url(image.name, size, storage=image.storage)
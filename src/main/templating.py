@@ -0,0 +1,153 @@
+"""
+Производительность шаблонов.
+
+warm_up_templates() компилирует все шаблоны при старте воркера
+(website/wsgi.py, website/asgi.py), чтобы первый запрос к каждой странице
+не платил за разбор шаблона: дальше их отдаёт cached.Loader.
+
+extract_inline_assets() выносит крупные inline-блоки <style>/<script> без
+шаблонных тегов в статические файлы (manage.py extract_inline_assets).
+Имена файлов нейтральные (шаблон + номер блока): хеш содержимого в имя
+добавляет collectstatic (ManifestStaticFilesStorage), и только такие копии
+nginx отдаёт с долгим сроком кеширования.
+"""
+import logging
+import os
+import re
+import textwrap
+from pathlib import Path
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+
+
+logger = logging.getLogger(__name__)
+
+INLINE_BLOCK_RE = re.compile(
+    r'^(?P<indent>[ \t]*)<(?P<tag>style|script)>(?P<body>.*?)</(?P=tag)>[ \t]*$',
+    re.S | re.M,
+)
+LOAD_STATIC_RE = re.compile(r'{%\s*load\s[^%]*\bstatic\b')
+EXTENDS_RE = re.compile(r'\s*{%\s*extends\s[^%]*%}\n?')
+TEMPLATE_SYNTAX = ('{%', '{{', '{#')
+ASSET_TYPES = {
+    'style': ('css', '<link rel="stylesheet" href="{{% static \'{path}\' %}}">'),
+    'script': ('js', '<script src="{{% static \'{path}\' %}}"></script>'),
+}
+ASSETS_SUBDIR = 'templates'
+MIN_ASSET_SIZE = 1000
+
+
+def _loader_dirs(loader):
+    """ Каталоги шаблонов загрузчика (у cached.Loader — его вложенных загрузчиков) """
+    if hasattr(loader, 'loaders'):
+        for inner in loader.loaders:
+            yield from _loader_dirs(inner)
+    elif hasattr(loader, 'get_dirs'):
+        yield from loader.get_dirs()
+
+
+def iter_template_names(loader):
+    """ Имена всех шаблонов, которые видит загрузчик """
+    seen = set()
+    for directory in _loader_dirs(loader):
+        directory = Path(directory)
+        if not directory.is_dir():
+            continue
+        for path in sorted(directory.rglob('*')):
+            if not path.is_file() or path.name.startswith('.'):
+                continue
+            name = path.relative_to(directory).as_posix()
+            if name not in seen:
+                seen.add(name)
+                yield name
+
+
+def warm_up_templates():
+    """ Компилирует все шаблоны во всех Django-движках. Возвращает (успешно, с ошибкой) """
+    compiled = failed = 0
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        engine = backend.engine
+        for loader in engine.template_loaders:
+            for name in iter_template_names(loader):
+                try:
+                    engine.get_template(name)
+                    compiled += 1
+                except (TemplateDoesNotExist, TemplateSyntaxError, UnicodeDecodeError):
+                    logger.warning("Не удалось скомпилировать шаблон %s", name, exc_info=True)
+                    failed += 1
+    logger.info("Скомпилировано шаблонов: %s, с ошибками: %s", compiled, failed)
+    return compiled, failed
+
+
+def asset_name(template_name, number, extension):
+    """ css/templates/product-product_detail-1.css """
+    stem = os.path.splitext(template_name)[0].replace('/', '-')
+    return f'{extension}/{ASSETS_SUBDIR}/{stem}-{number}.{extension}'
+
+
+def extract_from_template(template_name, text, min_size=MIN_ASSET_SIZE, existing=()):
+    """
+    Возвращает (новый текст шаблона, {путь в static: содержимое}).
+    Блоки с шаблонными тегами и атрибутами (<script src>, data-*) не трогаем.
+    existing — уже занятые пути: повторный запуск не перезапишет вынесенные раньше файлы.
+    """
+    assets = {}
+    taken = set(existing)
+
+    def replace(match):
+        body = match.group('body')
+        if len(body) < min_size or any(token in body for token in TEMPLATE_SYNTAX):
+            return match.group(0)
+
+        extension, tag = ASSET_TYPES[match.group('tag')]
+        content = textwrap.dedent(body).strip() + '\n'
+        number = 1
+        while asset_name(template_name, number, extension) in taken:
+            number += 1
+        path = asset_name(template_name, number, extension)
+        taken.add(path)
+        assets[path] = content
+        return match.group('indent') + tag.format(path=path)
+
+    return INLINE_BLOCK_RE.sub(replace, text), assets
+
+
+def extract_inline_assets(min_size=MIN_ASSET_SIZE, dry_run=False, static_dir=None):
+    """
+    Выносит inline-блоки из шаблонов проекта (TEMPLATES['DIRS']) в static_dir
+    (по умолчанию первый из STATICFILES_DIRS). Возвращает {шаблон: [пути ассетов]}.
+    """
+    static_dir = Path(static_dir or settings.STATICFILES_DIRS[0])
+    existing = {path.relative_to(static_dir).as_posix() for path in static_dir.glob(f'*/{ASSETS_SUBDIR}/*')}
+    result = {}
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for directory in backend.engine.dirs:
+            directory = Path(directory)
+            for path in sorted(directory.rglob('*.html')):
+                template_name = path.relative_to(directory).as_posix()
+                text = path.read_text(encoding='utf-8')
+                new_text, assets = extract_from_template(template_name, text, min_size, existing)
+                if not assets:
+                    continue
+                result[template_name] = list(assets)
+                existing.update(assets)
+                if dry_run:
+                    continue
+
+                for asset_path, content in assets.items():
+                    target = static_dir / asset_path
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    target.write_text(content, encoding='utf-8')
+                if not LOAD_STATIC_RE.search(new_text):
+                    # {% extends %} обязан быть первым тегом шаблона
+                    extends = EXTENDS_RE.match(new_text)
+                    position = extends.end() if extends else 0
+                    new_text = new_text[:position] + '{% load static %}\n' + new_text[position:]
+                path.write_text(new_text, encoding='utf-8')
+    return result
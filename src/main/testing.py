@@ -0,0 +1,139 @@
+"""
+Помощники для тестов: бюджеты SQL-запросов на страницы main.urls.
+
+Пример:
+
+    class QueryBudgetTests(QueryBudgetMixin, TestCase):
+        @classmethod
+        def setUpTestData(cls):
+            ...  # категории, товары, услуги
+
+        def test_query_budgets(self):
+            self.assertQueryBudgets()
+"""
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Category, Product, Service
+
+
+# Максимум SQL-запросов на одну страницу (маршрут -> бюджет). В бюджет страниц
+# с тегами кеша nginx входит регистрация адреса (main.edge_cache.register_url),
+# в бюджет выгрузки — постановка пересборки (проверка и вставка в SAVEPOINT)
+QUERY_BUDGETS = {
+    'main:index': 7,
+    'main:services': 3,
+    'main:about': 1,
+    'main:contacts': 1,
+    'main:category': 6,
+    'main:services_detail': 3,
+    'main:category_detail': 11,
+    'main:product_list': 13,
+    'main:product_detail': 7,
+    'main:search_products': 3,
+    'main:api_categories': 1,
+    'main:api_category_subtree': 1,
+    'main:api_products': 3,
+    'main:product_export': 6,
+}
+
+
+class CaptureAllQueries:
+    """
+    CaptureQueriesContext сразу на нескольких подключениях (по умолчанию на
+    всех: основная база и реплики). captured_queries — общий список, у каждого
+    запроса есть ключ 'alias'.
+    """
+
+    def __init__(self, aliases=None):
+        self.contexts = {alias: CaptureQueriesContext(connections[alias]) for alias in aliases or connections}
+
+    def __enter__(self):
+        with ExitStack() as stack:
+            for context in self.contexts.values():
+                stack.enter_context(context)
+            self._stack = stack.pop_all()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._stack.__exit__(*exc_info)
+
+    def __len__(self):
+        return sum(len(context) for context in self.contexts.values())
+
+    @property
+    def captured_queries(self):
+        return [
+            dict(query, alias=alias)
+            for alias, context in self.contexts.items()
+            for query in context.captured_queries
+        ]
+
+
+class QueryBudgetMixin:
+    """
+    Миксин для TestCase: проверяет, что страницы укладываются в бюджет запросов.
+    Слаги для маршрутов берутся из первых записей в тестовой базе.
+    """
+    query_budgets = QUERY_BUDGETS
+
+    def get_budget_urls(self):
+        category = Category.objects.filter(children__isnull=False).first()
+        leaf = Category.objects.filter(products__isnull=False).first()
+        product = Product.objects.first()
+        service = Service.objects.exclude(slug__isnull=True).first()
+
+        urls = {
+            'main:index': reverse('main:index'),
+            'main:services': reverse('main:services'),
+            'main:about': reverse('main:about'),
+            'main:contacts': reverse('main:contacts'),
+            'main:category': reverse('main:category'),
+            'main:search_products': reverse('main:search_products') + '?query=' + (product.name[:4] if product else 'ст'),
+            'main:api_categories': reverse('main:api_categories'),
+            'main:api_products': reverse('main:api_products'),
+            'main:product_export': (reverse('main:product_export', kwargs={'export_format': 'csv'})
+                                    + '?token=' + settings.EXPORT_TOKEN),
+        }
+        if category:
+            urls['main:category_detail'] = category.get_absolute_url()
+            urls['main:api_category_subtree'] = reverse('main:api_category_subtree', kwargs={'slug': category.slug})
+        if leaf:
+            urls['main:product_list'] = reverse('main:product_list', kwargs={'slug': leaf.slug})
+        if product:
+            urls['main:product_detail'] = product.get_absolute_url()
+        if service:
+            urls['main:services_detail'] = service.get_absolute_url()
+        return urls
+
+    def assertQueryBudget(self, url, budget, using=None, **extra):
+        """
+        Страница url выполняет не больше budget запросов. Считаются запросы
+        ко всем базам, доступным тесту (databases = '__all__' — и к репликам),
+        using — только к этим алиасам.
+        """
+        aliases = [using] if isinstance(using, str) else using or sorted(getattr(self, 'databases', connections))
+        with CaptureAllQueries(aliases) as context:
+            response = self.client.get(url, **extra)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+
+        executed = len(context)
+        if executed > budget:
+            queries = '\n'.join(f"[{query['alias']}] {query['sql']}" for query in context.captured_queries)
+            self.fail(f"{url}: {executed} SQL-запросов при бюджете {budget}\n{queries}")
+        return response
+
+    def assertQueryBudgets(self, budgets=None):
+        """ Проверяет все маршруты из бюджета, для которых нашлись данные """
+        budgets = budgets or self.query_budgets
+        urls = self.get_budget_urls()
+        for name, budget in budgets.items():
+            if name not in urls:
+                continue
+            with self.subTest(route=name):
+                self.assertQueryBudget(urls[name], budget)
@@ -1,3 +1,488 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, OperationalError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import jobs, sitemaps
+from .edge_cache import purge_cache_tags
+from .instrumentation import RequestMetrics, instrument_cache_backend, measure, registry
+from .models import Category, EdgeCacheEntry, Job, Product, Service
+from .routers import ReplicaHealth, ReplicaRouter, ReplicaRoutingMiddleware, health, replica_aliases
+from .signals import purge_deferred
+from .testing import CaptureAllQueries, QueryBudgetMixin
+from .utils import site_url
+
+
+@override_settings(EXPORT_TOKEN='test-token', EXPORT_ROOT=tempfile.gettempdir() + '/steelfed-test-exports')
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        root = Category.objects.create(name="Металлопрокат", slug='metalloprokat')
+        for number in range(3):
+            leaf = Category.objects.create(name=f"Лист {number}", slug=f'list-{number}', parent=root)
+            for index in range(5):
+                Product.objects.create(
+                    name=f"Лист стальной {number}-{index} мм Ст3 ГОСТ 19903-2015",
+                    slug=f'list-{number}-{index}',
+                    image=f'products/list-{number}-{index}.jpg',
+                    category=leaf,
+                )
+        Service.objects.create(name="Резка металла", slug='rezka', image='services/rezka.jpg')
+
+    def test_query_budgets(self):
+        self.assertQueryBudgets()
+
+
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        QueryBudgetTests.setUpTestData()
+
+    def setUp(self):
+        registry.reset()
+
+    def test_streaming_queries_recorded_after_body(self):
+        response = self.client.get(reverse('main:api_products'))
+        self.assertTrue(response.streaming)
+        self.assertNotIn('main:api_products', registry.snapshot()['views'])
+
+        b''.join(response.streaming_content)
+        stats = registry.snapshot()['views']['main:api_products']
+        self.assertEqual(stats['count'], 1)
+        self.assertGreater(stats['queries_sum'], 0)
+
+    def test_server_timing_only_for_staff(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('main:about')))
+        self.client.force_login(User.objects.create_user('staff', password='password', is_staff=True))
+        self.assertIn('queries', self.client.get(reverse('main:about'))['Server-Timing'])
+
+    def test_cache_get_many_counted_once(self):
+        instrument_cache_backend(type(caches['default']))
+        metrics = RequestMetrics()
+        with measure(metrics):
+            cache.set('instrumentation-test', 1)
+            cache.get_many(['instrumentation-test', 'instrumentation-missing'])
+            cache.get('instrumentation-missing')
+        self.assertEqual((metrics.cache_hits, metrics.cache_misses), (1, 2))
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    """ Выбор базы для чтения; реплики и их здоровье подменяются """
+
+    def setUp(self):
+        self.aliases = ['replica1', 'replica2']
+        self.unhealthy = set()
+        patches = [
+            mock.patch('main.routers.replica_aliases', lambda: self.aliases),
+            mock.patch.object(health, 'is_healthy', lambda alias: alias not in self.unhealthy),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def route(self, request, view=None):
+        """ Прогоняет запрос через ReplicaRoutingMiddleware, возвращает базу для чтения Product """
+        def get_response(request):
+            if view:
+                view()
+            response = HttpResponse()
+            response.read_db = self.router.db_for_read(Product)
+            return response
+        return ReplicaRoutingMiddleware(get_response)(request).read_db
+
+    def test_public_get_reads_from_replica(self):
+        self.assertIn(self.route(self.factory.get('/category/')), self.aliases)
+        self.assertIn(self.route(self.factory.head('/category/')), self.aliases)
+
+    def test_admin_reads_from_primary(self):
+        self.assertEqual(self.route(self.factory.get('/admin/main/product/')), DEFAULT_DB_ALIAS)
+
+    def test_unsafe_methods_read_from_primary(self):
+        self.assertEqual(self.route(self.factory.post('/category/')), DEFAULT_DB_ALIAS)
+
+    def test_read_after_write_goes_to_primary(self):
+        request = self.factory.get('/category/')
+        self.assertEqual(self.route(request, view=lambda: self.router.db_for_write(Product)), DEFAULT_DB_ALIAS)
+
+    def test_replica_fixed_for_request(self):
+        def get_response(request):
+            response = HttpResponse()
+            response.read_dbs = {self.router.db_for_read(Product) for _ in range(20)}
+            return response
+        response = ReplicaRoutingMiddleware(get_response)(self.factory.get('/category/'))
+        self.assertEqual(len(response.read_dbs), 1)
+
+    def test_unhealthy_replica_skipped(self):
+        self.unhealthy = {'replica1'}
+        for _ in range(10):
+            self.assertEqual(self.route(self.factory.get('/category/')), 'replica2')
+
+    def test_all_replicas_unhealthy_fall_back_to_primary(self):
+        self.unhealthy = set(self.aliases)
+        self.assertEqual(self.route(self.factory.get('/category/')), DEFAULT_DB_ALIAS)
+
+    def test_no_routing_outside_request(self):
+        self.assertEqual(self.router.db_for_read(Product), DEFAULT_DB_ALIAS)
+
+    def test_streaming_body_reads_from_replica(self):
+        def get_response(request):
+            return StreamingHttpResponse(self.router.db_for_read(Product) + '\n' for _ in range(2))
+        response = ReplicaRoutingMiddleware(get_response)(self.factory.get('/api/products/'))
+        read_dbs = set(b''.join(response.streaming_content).decode().split())
+        self.assertEqual(len(read_dbs), 1)
+        self.assertLessEqual(read_dbs, set(self.aliases))
+
+    @override_settings(DATABASE_REPLICA_MAX_LAG=5)
+    def test_health_check_by_replica_lag(self):
+        connection = mock.MagicMock(vendor='postgresql')
+        fetchone = connection.cursor.return_value.__enter__.return_value.fetchone
+        with mock.patch('main.routers.connections', {'replica1': connection}):
+            for lag, healthy in [(0, True), (3.5, True), (60, False), (None, False)]:
+                # None — WAL receiver отключён от основной базы
+                fetchone.return_value = (lag,)
+                self.assertIs(ReplicaHealth().check('replica1'), healthy)
+
+
+@skipUnless(replica_aliases(), "Реплики не настроены (DB_REPLICAS)")
+class ReplicaRoutingIntegrationTests(TransactionTestCase):
+    """ С настоящими репликами: DB_ENGINE=django.db.backends.sqlite3 DB_REPLICAS=<путь> """
+    databases = '__all__'
+
+    def setUp(self):
+        health.reset()
+        QueryBudgetTests.setUpTestData()
+        self.product = Product.objects.first()
+
+    def aliases_for(self, method, url, **extra):
+        """ Базы, с которых читала страница (запись адреса в индекс кеша nginx всегда идёт в основную) """
+        with CaptureAllQueries() as context:
+            getattr(self.client, method)(url, **extra)
+        return {query['alias'] for query in context.captured_queries if query['sql'].startswith('SELECT')}
+
+    def test_public_page_reads_from_replica(self):
+        aliases = self.aliases_for('get', self.product.get_absolute_url())
+        self.assertTrue(aliases)
+        self.assertLessEqual(aliases, set(replica_aliases()))
+
+    def test_admin_reads_from_primary(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.assertEqual(self.aliases_for('get', reverse('admin:main_product_changelist')), {DEFAULT_DB_ALIAS})
+
+    def test_unhealthy_replicas_fall_back_to_primary(self):
+        with mock.patch.object(health, 'check', return_value=False):
+            self.assertEqual(self.aliases_for('get', self.product.get_absolute_url()), {DEFAULT_DB_ALIAS})
+
+
+@override_settings(EDGE_CACHE_ENABLED=True, EDGE_CACHE_PURGE_URL='')
+class EdgeCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        QueryBudgetTests.setUpTestData()
+        cls.leaf = Category.objects.filter(products__isnull=False).first()
+
+    def test_query_strings_outside_allowlist_not_cached(self):
+        url = reverse('main:product_list', kwargs={'slug': self.leaf.slug})
+        self.assertEqual(self.client.get(url + '?page=1')['X-Accel-Expires'], '3600')
+        for query in ('?page=01', '?page=1&page=1', '?utm_source=mail', '?search=Ст3'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(url + query)['X-Accel-Expires'], '0')
+        self.assertEqual(
+            set(EdgeCacheEntry.objects.values_list('path', flat=True)), {url + '?page=1'},
+        )
+
+    def test_register_is_idempotent_and_purge_clears_tags(self):
+        self.client.get(reverse('main:index'))
+        self.client.get(reverse('main:index'))
+        self.assertEqual(EdgeCacheEntry.objects.filter(tag='catalog').count(), 1)
+
+        purge_cache_tags(['catalog'])
+        self.assertFalse(EdgeCacheEntry.objects.filter(tag='catalog').exists())
+        self.assertTrue(EdgeCacheEntry.objects.filter(tag='services').exists())
+
+    def test_category_products_cache_follows_changes(self):
+        url = reverse('main:category_detail', kwargs={'slug': self.leaf.parent.slug})
+        self.assertEqual(self.client.get(url).context['total_products'], 15)
+        product = Product.objects.create(name="Лист новый", slug='list-new', image='products/new.jpg', category=self.leaf)
+        self.assertEqual(self.client.get(url).context['total_products'], 16)
+        product.delete()
+        Product.objects.filter(category=self.leaf).first().delete()
+        page = self.client.get(url).context['page_obj']
+        self.assertEqual(page.paginator.count, 14)
+        self.assertTrue(all(isinstance(item, Product) for item in page))
+
+    def test_cascade_delete_queues_single_purge(self):
+        root = self.leaf.parent
+        category_ids = {root.id, *root.children.values_list('id', flat=True)}
+        Job.objects.all().delete()
+        with purge_deferred():
+            root.delete()
+        job = Job.objects.get()
+        self.assertEqual(job.name, 'main.tasks.purge_edge_cache')
+        tags, queued_category_ids = job.args
+        self.assertIn('catalog', tags)
+        self.assertEqual(len(tags), 1 + 15)  # catalog и product-<id> каждого товара
+        # Предков ищет воркер, в задачу попадают только номера категорий
+        self.assertEqual(set(queued_category_ids), category_ids)
+
+
+class CatalogApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Category.objects.create(name="Металлопрокат", slug='metalloprokat')
+        cls.sheets = Category.objects.create(name="Листы", slug='listy', parent=cls.root)
+        cls.pipes = Category.objects.create(name="Трубы", slug='truby')
+        names = [
+            (cls.sheets, "Лист 2 мм Ст3 ГОСТ 19903-2015"),
+            (cls.sheets, "Лист 12 мм Ст3"),
+            (cls.sheets, "Лист 1.2 мм 09Г2С"),
+            (cls.root, "Полоса 2мм Ст3"),
+            (cls.pipes, "Труба 2 мм 09Г2С ГОСТ 8732-78"),
+        ]
+        cls.products = [
+            Product.objects.create(name=name, slug=f'product-{index}', image='', category=category)
+            for index, (category, name) in enumerate(names)
+        ]
+
+    def get_json(self, url, **params):
+        response = self.client.get(url, params)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, json.loads(body)
+
+    def product_names(self, **params):
+        status, data = self.get_json(reverse('main:api_products'), **params)
+        self.assertEqual(status, 200)
+        return {item['name'] for item in data['results']}
+
+    def test_next_cursor_chains_to_last_page(self):
+        ids, params = [], {'limit': 2}
+        for _ in range(len(self.products)):
+            status, data = self.get_json(reverse('main:api_products'), **params)
+            self.assertEqual(status, 200)
+            ids += [item['id'] for item in data['results']]
+            if data['next_cursor'] is None:
+                break
+            params['cursor'] = data['next_cursor']
+        self.assertEqual(ids, [product.id for product in self.products])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_invalid_parameters_return_400(self):
+        for params in ({'cursor': '%%%'}, {'cursor': 'YWJj'}, {'limit': 'many'}, {'fields': 'id,price'}):
+            with self.subTest(params=params):
+                status, data = self.get_json(reverse('main:api_products'), **params)
+                self.assertEqual(status, 400)
+                self.assertIn('error', data)
+        status, _ = self.get_json(reverse('main:api_categories'), fields='id,price')
+        self.assertEqual(status, 400)
+
+    def test_unknown_category_returns_404(self):
+        self.assertEqual(self.get_json(reverse('main:api_products'), category='net-takoy')[0], 404)
+        url = reverse('main:api_category_subtree', kwargs={'slug': 'net-takoy'})
+        self.assertEqual(self.get_json(url)[0], 404)
+
+    def test_fields_limit_response(self):
+        status, data = self.get_json(reverse('main:api_products'), fields='id,category_slug', limit=1)
+        self.assertEqual(data['results'], [{'id': self.products[0].id, 'category_slug': 'listy'}])
+
+    def test_category_filter_includes_subtree(self):
+        self.assertEqual(self.product_names(category='metalloprokat'), {
+            "Лист 2 мм Ст3 ГОСТ 19903-2015", "Лист 12 мм Ст3", "Лист 1.2 мм 09Г2С", "Полоса 2мм Ст3",
+        })
+        self.assertEqual(self.product_names(category='truby'), {"Труба 2 мм 09Г2С ГОСТ 8732-78"})
+
+    def test_category_subtree(self):
+        status, data = self.get_json(reverse('main:api_category_subtree', kwargs={'slug': 'metalloprokat'}))
+        self.assertEqual(status, 200)
+        self.assertEqual(data['slug'], 'metalloprokat')
+        self.assertEqual([child['slug'] for child in data['children']], ['listy'])
+
+    def test_thickness_matches_whole_number(self):
+        self.assertEqual(self.product_names(thickness='2'), {
+            "Лист 2 мм Ст3 ГОСТ 19903-2015", "Полоса 2мм Ст3", "Труба 2 мм 09Г2С ГОСТ 8732-78",
+        })
+        self.assertEqual(self.product_names(thickness='1.2'), {"Лист 1.2 мм 09Г2С"})
+
+    def test_attribute_filters(self):
+        self.assertEqual(self.product_names(mark='09Г2С', gost='ГОСТ 8732-78'), {"Труба 2 мм 09Г2С ГОСТ 8732-78"})
+
+
+class SitemapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        QueryBudgetTests.setUpTestData()
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def product_locs(self, name):
+        with gzip.open(os.path.join(self.root, name), 'rt', encoding='utf-8') as file:
+            return re.findall(r'<loc>([^<]+)</loc>', file.read())
+
+    def test_products_split_into_shards(self):
+        with mock.patch.object(sitemaps, 'SITEMAP_LIMIT', 4):
+            changed = sitemaps.build_sitemaps(self.root)
+
+        shards = sorted(name for name in changed if name.startswith('sitemap-products-'))
+        self.assertEqual(shards, [f'sitemap-products-{number}.xml.gz' for number in range(1, 5)])
+        self.assertEqual([len(self.product_locs(name)) for name in shards], [4, 4, 4, 3])
+        expected = [site_url(product.get_absolute_url()) for product in Product.objects.order_by('id')]
+        self.assertEqual(sum((self.product_locs(name) for name in shards), []), expected)
+
+        with open(os.path.join(self.root, 'sitemap.xml'), encoding='utf-8') as file:
+            index = file.read()
+        for name in shards:
+            self.assertIn(name, index)
+
+    def test_unchanged_shards_not_rewritten(self):
+        sitemaps.build_sitemaps(self.root)
+        self.assertFalse(any(sitemaps.build_sitemaps(self.root).values()))
+        self.assertTrue(all(sitemaps.build_sitemaps(self.root, force=True).values()))
+        # Временные файлы (mkstemp) не остаются в каталоге
+        self.assertFalse([name for name in os.listdir(self.root) if name.startswith('.')])
+
+    def test_stale_shards_removed_after_shrink(self):
+        with mock.patch.object(sitemaps, 'SITEMAP_LIMIT', 4):
+            sitemaps.build_sitemaps(self.root)
+        stray = os.path.join(self.root, 'sitemap-products-9.xml.gz')
+        open(stray, 'w').close()
+
+        Product.objects.filter(id__in=Product.objects.order_by('id').values('id')[:10]).delete()
+        for force in (False, True):
+            with self.subTest(force=force), mock.patch.object(sitemaps, 'SITEMAP_LIMIT', 4):
+                sitemaps.build_sitemaps(self.root, force=force)
+                products = sorted(name for name in os.listdir(self.root) if name.startswith('sitemap-products-'))
+                self.assertEqual(products, ['sitemap-products-1.xml.gz', 'sitemap-products-2.xml.gz'])
+
+
+@jobs.job(name='tests.succeed', unique=True)
+def succeed_job(value=None):
+    return value
+
+
+@jobs.job(name='tests.fail', max_attempts=3)
+def fail_job():
+    raise ValueError("Ошибка задачи")
+
+
+@jobs.job(name='tests.swallow_timeout', max_attempts=1, timeout=0.05)
+def swallow_timeout_job():
+    try:
+        time.sleep(1)
+    except Exception:
+        return "таймаут проглочен"
+
+
+class JobQueueTests(TestCase):
+    def run_ready(self, job):
+        """ Делает отложенную задачу готовой, забирает и выполняет её """
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        claimed = jobs.claim('test')
+        self.assertEqual(claimed.pk, job.pk)
+        with self.assertLogs('main.jobs', 'INFO'):
+            return jobs.execute(claimed)
+
+    def test_claim_order(self):
+        now = timezone.now()
+        later = succeed_job.enqueue(1, run_at=now - timedelta(minutes=1))
+        earlier = succeed_job.enqueue(2, run_at=now - timedelta(minutes=5))
+        same_time = succeed_job.enqueue(3, run_at=now - timedelta(minutes=5))
+        succeed_job.enqueue(4, run_at=now + timedelta(minutes=5))
+
+        claimed = [jobs.claim('test') for _ in range(4)]
+        self.assertEqual([job and job.pk for job in claimed], [earlier.pk, same_time.pk, later.pk, None])
+        self.assertEqual((claimed[0].status, claimed[0].attempts, claimed[0].worker), (Job.RUNNING, 1, 'test'))
+
+    def test_retry_backoff_until_failed(self):
+        job = fail_job.enqueue()
+        for attempt, delay in [(1, jobs.RETRY_BASE_DELAY), (2, 2 * jobs.RETRY_BASE_DELAY)]:
+            before = timezone.now()
+            job = self.run_ready(job)
+            self.assertEqual((job.status, job.attempts), (Job.QUEUED, attempt))
+            self.assertGreaterEqual(job.run_at, before + timedelta(seconds=delay))
+            self.assertLess(job.run_at, before + timedelta(seconds=delay + 5))
+            self.assertIsNone(jobs.claim('test'))
+
+        job = self.run_ready(job)
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 3))
+        self.assertIn("Ошибка задачи", job.error)
+
+    def test_timeout_not_swallowed(self):
+        job = self.run_ready(swallow_timeout_job.enqueue())
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn("Превышено время выполнения", job.error)
+        self.assertIsNone(job.result)
+
+    def test_requeue_stale(self):
+        old = timezone.now() - timedelta(seconds=jobs.STALE_AFTER + 60)
+        retried = Job.objects.create(name='tests.fail', status=Job.RUNNING, attempts=1, started_at=old)
+        exhausted = Job.objects.create(name='tests.fail', status=Job.RUNNING, attempts=3, started_at=old)
+        fresh = Job.objects.create(name='tests.fail', status=Job.RUNNING, attempts=1, started_at=timezone.now())
+
+        with self.assertLogs('main.jobs', 'WARNING'):
+            self.assertEqual(jobs.requeue_stale(), (1, 1))
+        statuses = dict(Job.objects.values_list('id', 'status'))
+        self.assertEqual(
+            [statuses[retried.pk], statuses[exhausted.pk], statuses[fresh.pk]],
+            [Job.QUEUED, Job.FAILED, Job.RUNNING],
+        )
+
+    def test_prune_keeps_recent_and_failed(self):
+        old = timezone.now() - timedelta(days=jobs.KEEP_DONE_DAYS + 1)
+        Job.objects.create(name='tests.succeed', status=Job.DONE, finished_at=old)
+        recent = Job.objects.create(name='tests.succeed', status=Job.DONE, finished_at=timezone.now())
+        failed = Job.objects.create(name='tests.fail', status=Job.FAILED, finished_at=old)
+
+        self.assertEqual(jobs.prune_jobs(), 1)
+        self.assertEqual(set(Job.objects.values_list('id', flat=True)), {recent.pk, failed.pk})
+
+    def test_unique_deduplicated_while_active(self):
+        job = succeed_job.enqueue('a')
+        self.assertEqual(succeed_job.enqueue('a').pk, job.pk)
+        self.assertNotEqual(succeed_job.enqueue('b').pk, job.pk)
+
+        claimed = jobs.claim('test')
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(succeed_job.enqueue('a').pk, job.pk)
+
+        with self.assertLogs('main.jobs', 'INFO'):
+            jobs.execute(claimed)
+        self.assertNotEqual(succeed_job.enqueue('a').pk, job.pk)
+
+    def test_unique_enforced_by_database(self):
+        job = succeed_job.enqueue('a')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Job.objects.create(name=job.name, unique_key=job.unique_key)
+
+        # Гонка: проверка не нашла копию, вставка упёрлась в индекс — возвращается копия
+        with mock.patch.object(Job.objects, 'filter', side_effect=[Job.objects.none(), Job.objects.filter(pk=job.pk)]):
+            self.assertEqual(succeed_job.enqueue('a').pk, job.pk)
+
+    def test_worker_survives_result_save_error(self):
+        job = succeed_job.enqueue('a')
+        save_result = jobs.save_result
+        failures = [OperationalError("База недоступна")]
+
+        def flaky_save(job):
+            if failures:
+                raise failures.pop()
+            save_result(job)
+
+        with mock.patch.object(jobs, 'save_result', flaky_save), self.assertLogs('main.jobs', 'WARNING'):
+            self.assertEqual(jobs.work(poll_interval=0, burst=True), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
@@ -0,0 +1,51 @@
+"""
+Уменьшенные копии картинок товаров (WebP) рядом с оригиналами:
+products/foo.jpg -> thumbs/card/products/foo.webp.
+
+Генерируются фоновыми задачами (см. main.tasks), шаблон через фильтр
+thumbnail отдаёт миниатюру, если она уже есть, иначе оригинал.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+
+THUMBNAIL_SIZES = {
+    'card': (800, 400),
+}
+THUMBNAIL_QUALITY = 80
+
+
+def thumbnail_name(name, size='card'):
+    root, _ = os.path.splitext(name)
+    return f'thumbs/{size}/{root}.webp'
+
+
+def generate_thumbnail(name, size='card', storage=default_storage):
+    """ Создаёт (или пересоздаёт) миниатюру для файла name. Возвращает её имя. """
+    with storage.open(name, 'rb') as file:
+        image = Image.open(file)
+        image.load()
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    image.thumbnail(THUMBNAIL_SIZES[size], Image.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, format='WEBP', quality=THUMBNAIL_QUALITY, method=4)
+
+    target = thumbnail_name(name, size)
+    if storage.exists(target):
+        storage.delete(target)
+    return storage.save(target, ContentFile(buffer.getvalue()))
+
+
+def thumbnail_url(name, size='card', storage=default_storage):
+    """ URL миниатюры, если она уже сгенерирована, иначе URL оригинала """
+    if not name:
+        return ''
+    target = thumbnail_name(name, size)
+    return storage.url(target if storage.exists(target) else name)
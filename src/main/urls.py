@@ -1,4 +1,6 @@
 from .views import *
+from . import api, exports
+from .instrumentation import metrics_view
 from django.urls import path, include
 
 app_name = "main"
@@ -6,6 +8,13 @@ app_name = "main"
 
 urlpatterns = [
     path('', IndexPageView.as_view(), name='index'),
+
+    # JSON API каталога (должно идти раньше '<slug:slug>/products/')
+    path('api/categories/', api.CategoryTreeApiView.as_view(), name='api_categories'),
+    path('api/categories/<slug:slug>/', api.CategoryTreeApiView.as_view(), name='api_category_subtree'),
+    path('api/products/', api.ProductApiView.as_view(), name='api_products'),
+    path('export/<str:export_format>/', exports.ProductExportView.as_view(), name='product_export'),
+
     path('services/', ServiceViewPage.as_view(), name='services'),
     path('about/', AboutViewPage.as_view(), name='about'),
     path('delivery/', DeliveryViewPage.as_view(), name='delivery'),
@@ -24,5 +33,6 @@ urlpatterns = [
 
 
     path('search/', search_products, name='search_products'),
+    path('metrics/', metrics_view, name='metrics'),
 
 ]
\ No newline at end of file
@@ -0,0 +1,169 @@
+import fcntl
+import os
+import re
+import tempfile
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.urls import reverse
+
+from .models import Category
+
+
+THICKNESS_RE = re.compile(r"(\d+(\.\d+)?)\s*мм")
+MARK_RE = re.compile(r"(Ст\d+[пс|кп]?)")
+GOST_RE = re.compile(r"(ГОСТ\s*\d+-\d+)")
+
+
+def build_children_map():
+    """
+    Дерево категорий в памяти: parent_id -> [id дочерних категорий].
+    Строится одним запросом.
+    """
+    children_map = defaultdict(list)
+    for cat_id, parent_id in Category.objects.values_list('id', 'parent_id').order_by('id'):
+        children_map[parent_id].append(cat_id)
+    return children_map
+
+
+def get_subtree_ids(category_id, children_map=None):
+    """ Возвращает множество id категории и всех её потомков """
+    if children_map is None:
+        children_map = build_children_map()
+
+    category_ids = set()
+    stack = [category_id]
+
+    while stack:
+        current_id = stack.pop()
+        category_ids.add(current_id)
+        stack.extend(children_map.get(current_id, []))
+
+    return category_ids
+
+
+def parse_product_name(product_name):
+    """ Достаём характеристики (толщина, марка, ГОСТ, тип проката) из названия товара """
+    thickness = next(iter(THICKNESS_RE.findall(product_name)), ("Не указано",))[0] + " мм"
+    mark = next(iter(MARK_RE.findall(product_name)), "Не указано")
+    gost = next(iter(GOST_RE.findall(product_name)), "Не указано")
+    product_type = "горячекатаная" if "горячекатаная" in product_name else \
+                   "холоднокатаная" if "холоднокатаная" in product_name else "Не указано"
+
+    return {
+        "thickness": thickness,
+        "mark": mark,
+        "gost": gost,
+        "product_type": product_type,
+    }
+
+
+def build_category_paths(separator=' / '):
+    """
+    Полные пути категорий: id -> "Корень / Подкатегория / Категория".
+    Строится одним запросом, без обхода parent по каждой категории.
+    """
+    rows = {
+        cat_id: (name, parent_id)
+        for cat_id, name, parent_id in Category.objects.values_list('id', 'name', 'parent_id')
+    }
+    paths = {}
+
+    def path_for(cat_id):
+        if cat_id not in paths:
+            name, parent_id = rows[cat_id]
+            paths[cat_id] = path_for(parent_id) + separator + name if parent_id in rows else name
+        return paths[cat_id]
+
+    for cat_id in rows:
+        path_for(cat_id)
+    return paths
+
+
+def unique_slugs(model, bases, attempts=20):
+    """
+    Подбирает уникальные слаги для нескольких объектов сразу.
+
+    bases: {id объекта: желаемый слаг}. Возвращает {id: слаг}. Вместо цикла
+    «exists() на каждый суффикс» проверяет пачку кандидатов одним запросом.
+    """
+    result = {}
+    pending = dict(bases)
+    reserved = set()
+    counter = 0
+
+    while pending:
+        suffix = f"-{counter}" if counter else ''
+        candidates = {object_id: f"{base}{suffix}" for object_id, base in pending.items()}
+        # Слаг свободен, если его никто не занял или он уже принадлежит этому объекту
+        holders = dict(model.objects.filter(slug__in=candidates.values()).values_list('slug', 'pk'))
+        for object_id, candidate in candidates.items():
+            if holders.get(candidate, object_id) == object_id and candidate not in reserved:
+                result[object_id] = candidate
+                reserved.add(candidate)
+                del pending[object_id]
+        counter += 1
+        if counter > attempts and pending:
+            # Слишком много совпадений: смотрим все занятые суффиксы разом
+            for object_id, base in list(pending.items()):
+                existing = set(model.objects.filter(slug__startswith=base).values_list('slug', flat=True)) | reserved
+                number = counter
+                while f"{base}-{number}" in existing:
+                    number += 1
+                result[object_id] = f"{base}-{number}"
+                reserved.add(result[object_id])
+                del pending[object_id]
+    return result
+
+
+def site_url(path):
+    """ Абсолютный адрес на сайте (SITE_URL) для путей из reverse() и storage.url() """
+    return settings.SITE_URL.rstrip('/') + path
+
+
+def slug_url_builder(view_name):
+    """
+    Функция slug -> абсолютный адрес страницы view_name. reverse() вызывается
+    один раз, дальше только подстановка слага: для выгрузок на весь каталог.
+    """
+    prefix, suffix = reverse(view_name, kwargs={'slug': '__slug__'}).split('__slug__')
+    return lambda slug: site_url(f'{prefix}{slug}{suffix}')
+
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """
+    Блокировка пересборки файла (flock на path.lock): два процесса не пишут
+    его одновременно. blocking=False — BlockingIOError, если занято.
+    """
+    with open(f'{path}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        yield
+
+
+def temp_file_near(path):
+    """ Временный файл с уникальным именем в каталоге path: (fd, путь) """
+    return tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'.{os.path.basename(path)}.')
+
+
+def replace_file(tmp_path, path):
+    # mkstemp создаёт файл с правами 0600, а отдаёт его nginx
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def atomic_write(path, mode='w', **kwargs):
+    """
+    Пишет во временный файл с уникальным именем рядом с path и подменяет
+    path целиком: читатели никогда не видят недописанный файл.
+    """
+    fd, tmp_path = temp_file_near(path)
+    try:
+        with os.fdopen(fd, mode, **kwargs) as file:
+            yield file
+        replace_file(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
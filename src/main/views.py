@@ -1,27 +1,29 @@
 from datetime import datetime
 import random
-import re
-from collections import defaultdict
 
 from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.db.models import Q, Prefetch, Count
+from django.db.models import Q, Prefetch, Count, Max
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.template.loader import render_to_string
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from django.views import View
 from django.views.generic import TemplateView, ListView, DetailView
 from django_filters.views import FilterView
 
-from .models import Product, Category, Service
+from .edge_cache import CacheTagsMixin
+from .models import Product, Category, Service, ProductRecommendation, CategoryRecommendation
 from .filters import ProductFilter
+from .recommendations import ordered_by_ids
+from .utils import get_subtree_ids, parse_product_name
 
 
         
-class IndexPageView(TemplateView):
+class IndexPageView(CacheTagsMixin, TemplateView):
     template_name = 'website/index.html'
+
+    def get_cache_tags(self):
+        return ['index', 'catalog', 'services']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -79,8 +81,18 @@ class AjaxableTemplateView(TemplateView):
         content = soup.find(id="content")
         return str(content) if content else ""
 
-class ServiceViewPage(AjaxableTemplateView):
+class StaticPageMixin(CacheTagsMixin):
+    """ Страницы без данных из базы, сбрасываются только вместе со всем сайтом """
+
+    def get_cache_tags(self):
+        return ['pages']
+
+
+class ServiceViewPage(CacheTagsMixin, AjaxableTemplateView):
     template_name = 'website/services.html'
+
+    def get_cache_tags(self):
+        return ['services']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -89,69 +101,76 @@ class ServiceViewPage(AjaxableTemplateView):
         return context
 
 
-class AboutViewPage(AjaxableTemplateView):
+class AboutViewPage(StaticPageMixin, AjaxableTemplateView):
     template_name = 'website/about.html'
 
 
-class DeliveryViewPage(AjaxableTemplateView):
+class DeliveryViewPage(StaticPageMixin, AjaxableTemplateView):
     template_name = 'buyers/delivery.html'
 
 
-class PaymentViewPage(AjaxableTemplateView):
+class PaymentViewPage(StaticPageMixin, AjaxableTemplateView):
     template_name = 'buyers/payment.html'
 
 
-class RefundViewPage(AjaxableTemplateView):
+class RefundViewPage(StaticPageMixin, AjaxableTemplateView):
     template_name = 'buyers/refund.html'
 
 
-class ContactViewPage(AjaxableTemplateView):
+class ContactViewPage(StaticPageMixin, AjaxableTemplateView):
     template_name = 'website/contacts.html'
 
 
-class CategoryViewPage(TemplateView):
+class CategoryViewPage(CacheTagsMixin, TemplateView):
     template_name = 'category/index.html'
 
+    def get_cache_tags(self):
+        return ['catalog']
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         # Передаем категории и их продукты
         context['categories'] = (
             Category.objects.filter(parent__isnull=True)
             .order_by('id')
-            .only('id', 'name', 'slug')  # Загрузите только нужные поля
+            .only('id', 'name', 'slug', 'image')  # Загрузите только нужные поля
             .prefetch_related(
+                # parent_id / category_id нужны prefetch'у, иначе по запросу на каждую строку
                 Prefetch(
                     'children',
-                    queryset=Category.objects.only('id', 'name', 'slug')
+                    queryset=Category.objects.only('id', 'name', 'slug', 'parent_id')
                 ),
                 Prefetch(
                     'children__children',
-                    queryset=Category.objects.only('id', 'name', 'slug')
+                    queryset=Category.objects.only('id', 'name', 'slug', 'parent_id')
                 ),
                 Prefetch(
                     'products',
-                    queryset=Product.objects.only('id', 'name', 'slug')
+                    queryset=Product.objects.only('id', 'name', 'slug', 'category_id')
                 )
             )
         )
 
         return context
     
-class ServicesDetailView(DetailView):
+class ServicesDetailView(CacheTagsMixin, DetailView):
     model = Service
     template_name = 'website/service_detail.html'
     context_object_name = 'service'
 
+    def get_cache_tags(self):
+        return [f'service-{self.object.id}']
 
 
-class CategoryDetailView(DetailView):
+
+class CategoryDetailView(CacheTagsMixin, DetailView):
     model = Category
     template_name = 'category/category_detail.html'
     context_object_name = 'category'
 
-    @method_decorator(cache_page(60 * 15))  # Кэшируем страницу на 15 минут
-    def dispatch(self, *args, **kwargs):
-        return super().dispatch(*args, **kwargs)
+    # Страница целиком кешируется в nginx (main.edge_cache) и сбрасывается при изменении каталога
+    def get_cache_tags(self):
+        return ['catalog', f'category-{self.object.id}']
 
     def get_queryset(self):
         return Category.objects.prefetch_related(
@@ -166,7 +185,9 @@ class CategoryDetailView(DetailView):
         if not self.object.children.exists():
             return redirect('main:product_list', slug=self.object.slug)
 
-        return super().get(request, *args, **kwargs)
+        # Объект уже получен, не вызываем super().get(), чтобы не загружать его повторно
+        context = self.get_context_data(object=self.object)
+        return self.render_to_response(context)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -174,45 +195,40 @@ class CategoryDetailView(DetailView):
         
         subcategories = category.children.all()
 
-        # Получаем все категории
-        all_categories = Category.objects.only('id', 'parent_id')
-
-        # Строим дерево в памяти с использованием defaultdict
-        children_map = defaultdict(list)
-        for cat in all_categories:
-            children_map[cat.parent_id].append(cat.id)
-
-        # Собираем все id категорий и их потомков
-        category_ids = set()
-        stack = [category.id]
-
-        while stack:
-            current_id = stack.pop()
-            category_ids.add(current_id)
-            stack.extend(children_map.get(current_id, []))
-
-        # Используем кэш для списка продуктов
-        cache_key = f'category_{category.id}_products'
-        products = cache.get(cache_key)
-
-        if not products:
-            # Получаем продукты одним запросом по всем нужным категориям и сортируем их случайным образом
-            products = Product.objects.filter(category_id__in=category_ids).select_related('category').distinct()
-            products = products.order_by('?')  # Сортируем случайным образом
-
-            # Кэшируем результат на 15 минут
-            cache.set(cache_key, products, timeout=60 * 15)
-
-        # Пагинация
-        paginator = Paginator(products, 15)
+        # Собираем все id категорий и их потомков (дерево строится в памяти одним запросом)
+        category_ids = get_subtree_ids(category.id)
+
+        # В кеше — только перемешанный список id товаров поддерева. Версия ключа
+        # меняется при добавлении, удалении, переносе или изменении товара,
+        # поэтому кеш не нужно сбрасывать из других процессов
+        subtree_products = Product.objects.filter(category_id__in=category_ids)
+        version = subtree_products.aggregate(count=Count('id'), updated=Max('updated_at'))
+        updated = version['updated'].timestamp() if version['updated'] else 0
+        cache_key = f"category_{category.id}_products_{version['count']}_{updated}"
+        product_ids = cache.get(cache_key)
+
+        if product_ids is None:
+            # Порядок случайный, но на 15 минут один и тот же, чтобы страницы пагинации не пересекались
+            product_ids = list(subtree_products.order_by('?').values_list('id', flat=True))
+            cache.set(cache_key, product_ids, timeout=60 * 15)
+
+        # Пагинация по id, товары загружаются только для текущей страницы
+        paginator = Paginator(product_ids, 15)
         page_number = self.request.GET.get('page')
         page_obj = paginator.get_page(page_number)
+        page_obj.object_list = ordered_by_ids(Product.objects.select_related('category'), page_obj.object_list)
 
         # Получаем количество продуктов через пагинатор
         total_products = page_obj.paginator.count
 
         # Главные категории для меню
-        top_categories = Category.objects.filter(parent__isnull=True).only('id', 'name')
+        top_categories = (
+            Category.objects.filter(parent__isnull=True)
+            .only('id', 'name', 'slug')
+            .prefetch_related(
+                Prefetch('children', queryset=Category.objects.only('id', 'name', 'slug', 'parent_id'))
+            )
+        )
 
         # Передаем данные в шаблон
         context.update({
@@ -224,7 +240,7 @@ class CategoryDetailView(DetailView):
         return context
 
 
-class ProductListView(FilterView, ListView):
+class ProductListView(CacheTagsMixin, FilterView, ListView):
     model = Product
     template_name = 'product/product_list.html'
     context_object_name = 'products'
@@ -241,15 +257,24 @@ class ProductListView(FilterView, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         slug = self.kwargs.get('slug')
-        category = get_object_or_404(Category, slug=slug)
+        category = get_object_or_404(Category.objects.select_related('recommendation'), slug=slug)
         context['category'] = category
 
-        # Формируем список "похожих" категорий
-        similar_categories = Category.objects.filter(parent=category.parent).exclude(id=category.id)
-        
-        if not similar_categories.exists() and category.parent:
-            # Если нет категорий с таким же родителем, берем подкатегории родителя
-            similar_categories = Category.objects.filter(parent=category.parent.parent).exclude(id=category.id) if category.parent.parent else None
+        # Похожие категории берём из заранее посчитанного списка (manage.py build_recommendations)
+        try:
+            similar_ids = category.recommendation.category_ids
+        except CategoryRecommendation.DoesNotExist:
+            similar_ids = None
+
+        if similar_ids is not None:
+            similar_categories = ordered_by_ids(Category.objects.only('id', 'name', 'slug', 'image'), similar_ids)
+        else:
+            # Формируем список "похожих" категорий
+            similar_categories = Category.objects.filter(parent=category.parent).exclude(id=category.id)
+
+            if not similar_categories.exists() and category.parent:
+                # Если нет категорий с таким же родителем, берем подкатегории родителя
+                similar_categories = Category.objects.filter(parent=category.parent.parent).exclude(id=category.id) if category.parent.parent else None
 
         context['similar_categories'] = similar_categories
 
@@ -275,18 +300,39 @@ class ProductListView(FilterView, ListView):
         context['page_range'] = page_range
         context['current_page'] = current_page
         context['ancestors'] = category.get_ancestors()
+        self.category = category
         return context
 
+    def get_cache_tags(self):
+        # Похожие категории показываются по названиям, поэтому и тег всего каталога
+        return ['catalog', f'category-{self.category.id}']
+
 
-class ProductDetailView(DetailView):
+class ProductDetailView(CacheTagsMixin, DetailView):
     model = Product
     template_name = 'product/product_detail.html'
     context_object_name = 'product'
 
+    def get_cache_tags(self):
+        # Похожие товары и хлебные крошки берутся из категории
+        return [f'product-{self.object.id}', f'category-{self.object.category_id}']
+
+    def get_queryset(self):
+        return Product.objects.select_related('category', 'recommendation')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         product = self.object
 
+        # Похожие товары посчитаны заранее (manage.py build_recommendations), здесь один запрос
+        try:
+            similar_ids = product.recommendation.product_ids
+        except ProductRecommendation.DoesNotExist:
+            similar_ids = []
+        context['similar_products'] = ordered_by_ids(
+            Product.objects.only('id', 'name', 'slug'), similar_ids
+        ) if similar_ids else []
+
         # Распарсенные данные из названия
         context['parsed_data'] = self.parse_product_name(product.name)
 
@@ -301,18 +347,7 @@ class ProductDetailView(DetailView):
 
     @staticmethod
     def parse_product_name(product_name):
-        thickness = next(iter(re.findall(r"(\d+(\.\d+)?)\s*мм", product_name)), ("Не указано",))[0] + " мм"
-        mark = next(iter(re.findall(r"(Ст\d+[пс|кп]?)", product_name)), "Не указано")
-        gost = next(iter(re.findall(r"(ГОСТ\s*\d+-\d+)", product_name)), "Не указано")
-        product_type = "горячекатаная" if "горячекатаная" in product_name else \
-                       "холоднокатаная" if "холоднокатаная" in product_name else "Не указано"
-
-        return {
-            "thickness": thickness,
-            "mark": mark,
-            "gost": gost,
-            "product_type": product_type,
-        }
+        return parse_product_name(product_name)
 
 
 
@@ -335,7 +370,7 @@ def search_products(request):
         ]
 
         # Поиск категорий по названию
-        categories = Category.objects.filter(name__icontains=query)
+        categories = Category.objects.filter(name__icontains=query).select_related('parent')
         category_results = [
             {
                 'name': category.name,
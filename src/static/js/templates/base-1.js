@@ -0,0 +1,46 @@
+document.getElementById('search-input').addEventListener('input', function() {
+    const query = this.value.trim();
+    const resultsContainer = document.getElementById('search-results');
+
+    if (query.length > 0) {  // Начинать поиск, если введено более 1 символа
+        fetch(`/search/?query=${encodeURIComponent(query)}`)
+            .then(response => response.json())
+            .then(data => {
+                resultsContainer.innerHTML = '';  // Очистить текущие результаты
+                if (data.results.length > 0) {
+                    resultsContainer.style.display = 'block';  // Показать результаты
+                    data.results.forEach(result => {
+                        const li = document.createElement('li');
+                        li.style.padding = '8px';
+                        li.style.borderBottom = '1px solid #e2e6ed';
+                        if (result.type === 'product') {
+                            // Если это продукт
+                            li.innerHTML = `
+                                <a href="/product/${result.slug}" style="color: #262a31; text-decoration: none;">
+                                     ${result.name}
+                                </a>`;
+                        } else if (result.type === 'category') {
+                            // Если это категория
+                            li.innerHTML = `
+                                <a href="/category/${result.slug}" style="color: #262a31; text-decoration: none;">
+                                     ${result.name}
+                                </a>`;
+                        } else if (result.type === 'none') {
+                            // Если ничего не найдено
+                            li.innerHTML = `
+                                <span style="color: #262a31;">${result.name}</span>`;
+                        }
+                        resultsContainer.appendChild(li);
+                    });
+                } else {
+                    resultsContainer.style.display = 'none';  // Скрыть, если нет результатов
+                }
+            })
+            .catch(error => {
+                console.error('Ошибка загрузки данных:', error);
+                resultsContainer.style.display = 'none';  // Скрыть, если произошла ошибка
+            });
+    } else {
+        resultsContainer.style.display = 'none';  // Скрыть результаты, если менее 2 символов
+    }
+});
@@ -0,0 +1,37 @@
+document.addEventListener('DOMContentLoaded', function () {
+  const whatsappBtn = document.querySelector('.whatsapp-float')
+  const whatsappBubble = document.querySelector('.whatsapp-bubble')
+
+  function startRingAnimation() {
+    whatsappBtn.style.animation = 'ring 1.5s'
+    setTimeout(() => {
+      whatsappBtn.style.animation = ''
+    }, 1500)
+  }
+
+  function showBubble() {
+    const lastShown = localStorage.getItem('whatsappLastShown')
+    const now = Date.now()
+
+    if (!lastShown || now - lastShown > 15000) {
+      // 15 секунд прошло?
+      whatsappBubble.classList.add('show')
+      localStorage.setItem('whatsappLastShown', now)
+
+      setTimeout(() => {
+        whatsappBubble.classList.remove('show')
+      }, 5000)
+    }
+  }
+
+  // 🛑 Если пользователь наводит курсор на WhatsApp, облако скрывается
+  whatsappBtn.addEventListener('mouseenter', function () {
+    whatsappBubble.classList.remove('show')
+  })
+
+  // 🔁 Показываем облако раз в 15 секунд (но не сразу)
+  setInterval(showBubble, 15000)
+
+  // 🔁 Запускаем звонок каждые 10 секунд
+  setInterval(startRingAnimation, 2000)
+})
@@ -0,0 +1,17 @@
+document.addEventListener("DOMContentLoaded", function () {
+    const pageUrl = encodeURIComponent(window.location.href);
+    const pageTitle = encodeURIComponent(document.title);
+
+    document.getElementById("share-facebook").setAttribute("href", `https://www.facebook.com/sharer/sharer.php?u=${pageUrl}`);
+    document.getElementById("share-whatsapp").setAttribute("href", `https://wa.me/?text=${pageTitle}%20${pageUrl}`);
+    document.getElementById("share-telegram").setAttribute("href", `https://t.me/share/url?url=${pageUrl}&text=${pageTitle}`);
+
+    document.getElementById("copy-link").addEventListener("click", function (e) {
+        e.preventDefault();
+        navigator.clipboard.writeText(window.location.href).then(() => {
+            alert("Ссылка скопирована!");
+        }).catch(err => {
+            console.error("Ошибка копирования: ", err);
+        });
+    });
+});
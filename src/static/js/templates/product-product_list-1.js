@@ -0,0 +1,27 @@
+document.addEventListener("DOMContentLoaded", function () {
+	const searchInput = document.querySelector("input[name='search']");
+	const resultsContainer = document.getElementById("listing-table-target");
+	const productCount = document.getElementById("product-count");
+
+	if (searchInput) {
+		searchInput.addEventListener("input", function () {
+			const query = searchInput.value.trim();
+			const url = new URL(window.location.href);
+			url.searchParams.set("search", query);
+
+			// AJAX-запрос без перезагрузки страницы
+			fetch(url, { method: "GET", headers: { "X-Requested-With": "XMLHttpRequest" } })
+				.then(response => response.text())
+				.then(data => {
+					const parser = new DOMParser();
+					const newDocument = parser.parseFromString(data, "text/html");
+					const newResults = newDocument.querySelector("#listing-table-target")?.innerHTML || "";
+					const newCount = newDocument.querySelector("#product-count")?.textContent || "0";
+
+					resultsContainer.innerHTML = newResults;
+					productCount.textContent = newCount;
+				})
+				.catch(error => console.error("Ошибка при загрузке товаров:", error));
+		});
+	}
+});
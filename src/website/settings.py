@@ -31,7 +31,7 @@ ALLOWED_HOSTS = ['steelfed.kz', 'www.steelfed.kz', '*']
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    'main.apps.CatalogAdminConfig',  # django.contrib.admin со своим AdminSite
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -41,11 +41,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.instrumentation.InstrumentationMiddleware',
+    'main.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.edge_cache.EdgeCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -56,8 +59,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [ BASE_DIR / 'templates' ],
-        'APP_DIRS': True,
+        'APP_DIRS': False,
         'OPTIONS': {
+            # Скомпилированные шаблоны живут в памяти воркера (прогрев — TEMPLATE_WARMUP)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -82,17 +92,42 @@ WSGI_APPLICATION = 'website.wsgi.application'
 # }
 
 
+# Все параметры подключения можно переопределить через окружение.
+# DB_REPLICAS — реплики для чтения через запятую: "host1:5432,host2" для PostgreSQL
+# или пути к файлам для SQLite (DB_ENGINE=django.db.backends.sqlite3, локальные тесты).
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.postgresql')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'steelfed_db',
-        'USER': 'tab1k',
-        'PASSWORD': 'TOBI8585',
-        'HOST': 'postgres',  # Должно совпадать с именем контейнера
-        'PORT': '5432',
+        'ENGINE': DB_ENGINE,
+        'NAME': os.environ.get('DB_NAME', 'steelfed_db'),
+        'USER': os.environ.get('DB_USER', 'tab1k'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'TOBI8585'),
+        'HOST': os.environ.get('DB_HOST', 'postgres'),  # Должно совпадать с именем контейнера
+        'PORT': os.environ.get('DB_PORT', '5432'),
     }
 }
 
+for number, replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    replica = replica.strip()
+    if DB_ENGINE.endswith('sqlite3'):
+        replica_settings = {'NAME': replica}
+    else:
+        host, _, port = replica.partition(':')
+        replica_settings = {'HOST': host, 'PORT': port or DATABASES['default']['PORT']}
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        **replica_settings,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Чтение каталога с реплик (main.routers)
+DATABASE_ROUTERS = ['main.routers.ReplicaRouter']
+DATABASE_REPLICA_APPS = ('main',)
+DATABASE_REPLICA_EXCLUDE_PATHS = ('/admin/',)
+DATABASE_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', '5'))  # секунд
+DATABASE_REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', '5'))  # секунд
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -142,8 +177,70 @@ STATICFILES_DIRS = [
 ]
 MEDIA_URL = '/media/'
 
+# collectstatic добавляет в имена файлов хеш содержимого (main.storage)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'main.storage.LenientManifestStaticFilesStorage',
+    },
+}
+
 CSRF_TRUSTED_ORIGINS = ["https://steelfed.kz", "https://www.steelfed.kz"]
 
+# Адрес сайта и данные магазина для выгрузок каталога (CSV / YML)
+SITE_URL = os.environ.get('SITE_URL', 'https://steelfed.kz')
+SHOP_NAME = 'SteelFed'
+SHOP_CURRENCY = 'KZT'
+EXPORT_CHUNK_SIZE = 2000
+# Готовые файлы выгрузок (main.tasks.rebuild_export, manage.py export_catalog)
+EXPORT_ROOT = os.path.join(BASE_DIR, 'exports')
+# Токен для маркетплейсов: /export/yml/?token=...; пусто — выгрузки доступны только сотрудникам
+EXPORT_TOKEN = os.environ.get('EXPORT_TOKEN', '')
+# internal-location nginx, через который отдаются файлы выгрузок; пусто — отдаёт сам Django
+EXPORT_ACCEL_REDIRECT = os.environ.get('EXPORT_ACCEL_REDIRECT', '')
+
+# Готовые файлы sitemap (manage.py build_sitemaps), отдаются nginx'ом
+SITEMAP_ROOT = os.path.join(BASE_DIR, 'sitemaps')
+SITEMAP_URL = '/sitemaps/'
+
+# Метрики запросов (main.instrumentation): заголовок Server-Timing (только для сотрудников)
+# и гистограммы по представлениям
+INSTRUMENTATION_ENABLED = True
+INSTRUMENTATION_SERVER_TIMING = True
+# Сколько самых долгих шаблонов и блоков показывать в Server-Timing
+INSTRUMENTATION_TEMPLATE_TOP = 5
+
+# Компилировать все шаблоны при старте воркера (website/wsgi.py, website/asgi.py)
+TEMPLATE_WARMUP = True
+
+# Заранее отрендеренные информационные страницы и услуги (manage.py prerender), отдаются nginx'ом
+PRERENDER_ROOT = os.path.join(BASE_DIR, 'prerendered')
+
+# Очередь фоновых задач (main.jobs, manage.py run_worker)
+JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', 2))
+JOB_POLL_INTERVAL = 1.0
+JOB_RETRY_BASE_DELAY = 30  # Задержка перед повтором: 30 с, 60 с, 120 с...
+JOB_TIMEOUT = 30 * 60
+JOB_KEEP_DONE_DAYS = 7  # Выполненные задачи старше удаляются (manage.py prune_jobs, воркер раз в час)
+JOB_STALE_AFTER = 3 * 60 * 60  # Больше самого долгого таймаута задачи (2 ч)
+
+# Кеш страниц для анонимных посетителей в nginx (main.edge_cache). Адреса страниц
+# по тегам хранятся в базе (EdgeCacheEntry)
+EDGE_CACHE_ENABLED = True
+EDGE_CACHE_TTL = 60 * 60
+# Куда слать запросы на обновление кеша (nginx во внутренней сети docker), пусто — не слать
+EDGE_CACHE_PURGE_URL = os.environ.get('EDGE_CACHE_PURGE_URL', '')
+
+# Кеш в памяти каждого процесса: из других процессов его не сбрасывают,
+# ключи с изменяемыми данными содержат версию (см. CategoryDetailView)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
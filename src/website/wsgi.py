@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'website.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'TEMPLATE_WARMUP', False):
+    # Разбираем все шаблоны до первого запроса, дальше их держит cached.Loader
+    from main.templating import warm_up_templates  # noqa: E402
+    warm_up_templates()